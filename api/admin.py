@@ -1,10 +1,252 @@
+from datetime import datetime, timedelta
+
+from django import forms
 from django.contrib import admin
-from .models import Note
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, QuerySet
+from django.http import Http404, HttpResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from django.utils.translation import gettext as _
+
+from .fields import COMPRESSED_MARKER, decompress_prefix, stored_prefix, stored_prefix_length
+from .models import Note, Task
+from .profiling import (
+    get_profiling_settings,
+    list_profiles,
+    make_profile_token,
+    read_profile,
+    summarize_profile,
+)
+from .trigrams import chunked, substring_candidates
+
+# Characters of a note's body shown in the changelist, as in Note.__str__.
+PREVIEW_LENGTH = 50
+
+
+def estimate_count(queryset):
+    """
+    Rows in the table of `queryset` from the database's statistics, or None
+    without any: reltuples on PostgreSQL, sqlite_stat1 on SQLite. Both are
+    as of the last ANALYZE (archive_notes() runs one).
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] > 0 else None
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # One row per index, each starting with the table's row count.
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+            return max(counts, default=None)
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts at most EXACT_COUNT_LIMIT rows. Past that, the whole table is
+    estimated (see estimate_count()). A filtered list, or a table without
+    statistics, is cut off at the limit and shown as e.g. "10,000+", so
+    opening a changelist never counts millions of rows.
+    """
+    EXACT_COUNT_LIMIT = 10000
+
+    is_capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        count = queryset.order_by().values('pk')[:self.EXACT_COUNT_LIMIT + 1].count()
+        if count <= self.EXACT_COUNT_LIMIT:
+            return count
+        estimate = estimate_count(queryset) if not queryset.query.where else None
+        if estimate is None:
+            self.is_capped = True
+            return count
+        return max(estimate, count)
+
+    @property
+    def display_count(self):
+        return f'{self.EXACT_COUNT_LIMIT:,}+' if self.is_capped else self.count
+
+
+def next_period(start, kind):
+    if kind == 'year':
+        return start.replace(year=start.year + 1)
+    if kind == 'month':
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    day = start.date() + timedelta(days=1)
+    return datetime(day.year, day.month, day.day, tzinfo=start.tzinfo)
+
+
+class IndexedDatesQuerySet(QuerySet):
+    """
+    datetimes() for the date_hierarchy without truncating every row's date,
+    which scans the whole table: each year, month or day between the first
+    and last date is checked with a range query on the index instead. There
+    are at most a few dozen of them.
+    """
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        values = self.order_by().values_list(field_name, flat=True).exclude(**{field_name: None})
+        first = values.order_by(field_name).first()
+        if first is None:
+            return []
+        last = values.order_by(f'-{field_name}').first()
+        tzinfo = tzinfo or timezone.get_current_timezone()
+        first = first.astimezone(tzinfo)
+        start = datetime(
+            first.year, 1 if kind == 'year' else first.month, 1 if kind != 'day' else first.day,
+            tzinfo=tzinfo,
+        )
+        periods = []
+        while start <= last:
+            end = next_period(start, kind)
+            if self.filter(**{f'{field_name}__gte': start, f'{field_name}__lt': end}).exists():
+                periods.append(start)
+            start = end
+        return periods if order == 'ASC' else periods[::-1]
+
+
+class NoteChangeList(ChangeList):
+
+    def get_queryset(self, request, exclude_parameters=None):
+        # Rows only show a preview, so only that much of the body is read.
+        queryset = super().get_queryset(request, exclude_parameters)
+        return queryset.defer('body').annotate(body_prefix=stored_prefix('body', PREVIEW_LENGTH + 1))
+
 
 @admin.register(Note)
 class NoteAdmin(admin.ModelAdmin):
-    list_display = ('body', 'created', 'updated')
-    list_filter = ('created', 'updated')
+    list_display = ('body_preview', 'created', 'updated')
+    list_filter = ('created',)
+    date_hierarchy = 'updated'
     search_fields = ('body',)
     ordering = ('-updated',)
-    readonly_fields = ('created', 'updated')
\ No newline at end of file
+    readonly_fields = ('created', 'updated')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(queryset.model, queryset.query, queryset.db)
+
+    def get_changelist(self, request, **kwargs):
+        return NoteChangeList
+
+    def action_checkbox(self, note):
+        # As ModelAdmin's, but labelled with the preview: str(note) would load the body.
+        attrs = {
+            'class': 'action-select',
+            'aria-label': format_html(_('Select this object for an action - {}'), self.body_preview(note)),
+        }
+        return forms.CheckboxInput(attrs, lambda value: False).render(helpers.ACTION_CHECKBOX_NAME, str(note.pk))
+
+    @admin.display(description='body')
+    def body_preview(self, note):
+        prefix = note.body_prefix or ''
+        text = decompress_prefix(prefix, PREVIEW_LENGTH + 1)
+        if len(text) <= PREVIEW_LENGTH and len(prefix) == stored_prefix_length(PREVIEW_LENGTH + 1):
+            # Compresses too poorly for the prefix to reach that far.
+            text = note.body[:PREVIEW_LENGTH + 1]
+        return text[:PREVIEW_LENGTH] + '...' if len(text) > PREVIEW_LENGTH else text
+
+    # Past this many notes per trigram, searching scans instead.
+    search_candidate_limit = 5000
+
+    def get_search_results(self, request, queryset, search_term):
+        terms = [term.lower() for term in search_term.split()]
+        if not terms:
+            return queryset, False
+
+        # Candidates from the trigram index, for the terms long enough to have
+        # trigrams. Notes saved since they were last indexed are scanned.
+        candidates = None
+        for term in terms:
+            found = substring_candidates(term, self.search_candidate_limit)
+            if found is not None:
+                candidates = set(found) if candidates is None else candidates & set(found)
+        if candidates is None:
+            return self.scan_search_results(request, queryset, search_term, terms)
+
+        stale = queryset.exclude(trigram_index__indexed__gte=F('updated'))
+        results, may_have_duplicates = self.scan_search_results(request, stale, search_term, terms)
+        matches = [
+            pk
+            for chunk in chunked(candidates)
+            for pk, body in queryset.filter(pk__in=chunk).values_list('pk', 'body')
+            if all(term in (body or '').lower() for term in terms)
+        ]
+        return results | queryset.filter(pk__in=matches), may_have_duplicates
+
+    def scan_search_results(self, request, queryset, search_term, terms):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        # Compressed bodies can't be matched by LIKE, so check those in Python.
+        compressed = queryset.filter(body__startswith=COMPRESSED_MARKER).values_list('pk', 'body')
+        matches = [
+            pk for pk, body in compressed.iterator()
+            if all(term in body.lower() for term in terms)
+        ]
+        return results | queryset.filter(pk__in=matches), may_have_duplicates
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_after', 'created')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created', 'claimed_by', 'claimed_at')
+
+
+def profile_list_view(request):
+    """Staff-only list of stored request profiles."""
+    options = get_profiling_settings()
+    profiles = list_profiles(options['DIRECTORY'])
+    for profile in profiles:
+        profile['modified'] = datetime.fromtimestamp(profile['modified'])
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiles,
+        'header': options['HEADER'],
+        'token': make_profile_token(),
+        'token_max_age': options['TOKEN_MAX_AGE'],
+        'sample_rate': options['SAMPLE_RATE'],
+    }
+    return TemplateResponse(request, 'admin/profiles/list.html', context)
+
+
+def profile_detail_view(request, name):
+    """Top functions of one profile, or the raw folded stacks with ?raw=1."""
+    options = get_profiling_settings()
+    try:
+        folded = read_profile(options['DIRECTORY'], name)
+    except FileNotFoundError:
+        raise Http404('Profile not found')
+
+    if request.GET.get('raw'):
+        response = HttpResponse(folded, content_type='text/plain')
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        return response
+
+    samples, rows = summarize_profile(folded)
+    context = {
+        **admin.site.each_context(request),
+        'title': name,
+        'name': name,
+        'samples': samples,
+        'rows': rows,
+    }
+    return TemplateResponse(request, 'admin/profiles/detail.html', context)
@@ -0,0 +1,99 @@
+import contextvars
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import invalidate_note_lists
+from .models import ArchivedNote, Note
+
+_archiving = contextvars.ContextVar('archiving', default=False)
+
+
+@contextmanager
+def archiving():
+    """Notes deleted in this block are being archived, not removed."""
+    token = _archiving.set(True)
+    try:
+        yield
+    finally:
+        _archiving.reset(token)
+
+
+def is_archiving():
+    return _archiving.get()
+
+
+def archive_notes(older_than, batch_size=500):
+    """
+    Move notes not updated within `older_than` (a timedelta) to the archive,
+    one transaction per batch. Their revisions stay where they are; their
+    trigram index rows are dropped and rebuilt if they're restored. Returns
+    the number of notes archived.
+    """
+    cutoff = timezone.now() - older_than
+    archived = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Note.objects
+                .filter(pk__gt=last_pk, updated__lt=cutoff)
+                .order_by('pk')[:batch_size]
+            )
+            if not batch:
+                break
+            ArchivedNote.objects.bulk_create([
+                ArchivedNote(
+                    id=note.pk, body=note.body, updated=note.updated, created=note.created,
+                    version=note.version,
+                )
+                for note in batch
+            ])
+            with archiving():
+                Note.objects.filter(pk__in=[note.pk for note in batch]).delete()
+        cache.delete_many([f'note_{note.pk}' for note in batch])
+        archived += len(batch)
+        last_pk = batch[-1].pk
+    if archived:
+        invalidate_note_lists()
+        analyze(Note, ArchivedNote)
+    return archived
+
+
+def analyze(*models):
+    """Refresh the statistics the admin estimates row counts from."""
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+
+def get_archived_note(pk):
+    """An unsaved Note for archived note `pk`, for reading only."""
+    archived = ArchivedNote.objects.get(pk=pk)
+    return Note(
+        pk=archived.pk, body=archived.body, updated=archived.updated, created=archived.created,
+        version=archived.version,
+    )
+
+
+@transaction.atomic
+def restore_note(pk):
+    """Move archived note `pk` back to api_note, keeping its timestamps."""
+    archived = ArchivedNote.objects.get(pk=pk)
+    note = Note(pk=archived.pk, body=archived.body, version=archived.version)
+    note.save(force_insert=True)
+    # auto_now and auto_now_add don't allow setting these on save().
+    Note.objects.filter(pk=note.pk).update(updated=archived.updated, created=archived.created)
+    note.updated = archived.updated
+    note.created = archived.created
+    archived.delete()
+    invalidate_note_lists()
+    return note
+
+
+def note_exists(pk):
+    return Note.objects.filter(pk=pk).exists() or ArchivedNote.objects.filter(pk=pk).exists()
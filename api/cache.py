@@ -0,0 +1,28 @@
+import time
+
+from django.core.cache import cache
+
+NOTE_LIST_KEY = 'notes_all'
+NOTE_LIST_TIMEOUT = 60 * 15
+
+
+def note_list_key(selection=None):
+    """
+    Cache key of the note list for a field selection and preview length. The
+    full list keeps its 'notes_all' key; other selections also carry the
+    list generation, so invalidate_note_lists() drops all of them at once.
+    """
+    if not selection:
+        return NOTE_LIST_KEY
+    # Starts from the clock so a generation lost to eviction is never reused.
+    generation = cache.get_or_set('notes_generation', time.time_ns, timeout=None)
+    return f'{NOTE_LIST_KEY}_{generation}_{selection}'
+
+
+def invalidate_note_lists():
+    cache.delete(NOTE_LIST_KEY)
+    try:
+        cache.incr('notes_generation')
+    except ValueError:
+        # Evicted: the next note_list_key() starts a new generation anyway.
+        pass
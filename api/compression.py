@@ -0,0 +1,103 @@
+import hashlib
+import re
+
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = re.compile(r'^(text/|application/(json|javascript|xml|.*\+json|.*\+xml)|image/svg\+xml)')
+ACCEPTS_BROTLI = re.compile(r'\bbr\b')
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+# GZipMiddleware's default.
+GZIP_MAX_RANDOM_BYTES = 100
+
+
+def accepted_encoding(accept_encoding, allow_brotli=True):
+    if allow_brotli and brotli is not None and ACCEPTS_BROTLI.search(accept_encoding):
+        return 'br'
+    if ACCEPTS_GZIP.search(accept_encoding):
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=5)
+    # Random padding, as in GZipMiddleware, against BREACH.
+    return compress_string(content, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+
+
+def mark_cache_served(response):
+    """Let CompressionMiddleware keep the compressed copy of `response`."""
+    response.cache_served = True
+    return response
+
+
+class CompressionMiddleware:
+    """
+    Negotiates brotli or gzip for responses.
+
+    Views mark responses whose payload is itself served from a cache (the
+    note list, a single note, the schema) with mark_cache_served(). Their
+    compressed copies are cached too, keyed by a digest of the uncompressed
+    body, so each is only compressed once per encoding. Everything else is
+    compressed on the fly and not stored.
+
+    HTML pages carry CSRF tokens and echo input back, so they only get
+    gzip, which is padded against BREACH; brotli has no such padding.
+    """
+    min_length = 200
+    cache_timeout = 60 * 15
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        content_type = response.get('Content-Type', '')
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or len(response.content) < self.min_length
+            or not COMPRESSIBLE_TYPES.match(content_type)
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = accepted_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+            allow_brotli=not content_type.startswith('text/html'),
+        )
+        if encoding is None:
+            return response
+
+        if (
+            getattr(response, 'cache_served', False)
+            and request.method in ('GET', 'HEAD')
+            and response.status_code == 200
+        ):
+            digest = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+            cache_key = f'compressed_{encoding}_{digest}'
+            compressed = cache.get(cache_key)
+            if compressed is None:
+                compressed = compress(response.content, encoding)
+                cache.set(cache_key, compressed, timeout=self.cache_timeout)
+        else:
+            compressed = compress(response.content, encoding)
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,95 @@
+import base64
+import zlib
+
+from django.db import models
+from django.db.models.functions import Substr
+
+# Stored values starting with COMPRESSED_MARKER hold base64-encoded zlib data.
+# Plain values that happen to start with a marker are prefixed with
+# ESCAPED_MARKER, so anything else (including rows written before the field
+# was introduced) is read back unchanged.
+COMPRESSED_MARKER = '\x01'
+ESCAPED_MARKER = '\x02'
+
+
+def compress_text(value, threshold=1024, level=6):
+    if value is None:
+        return None
+    if len(value) >= threshold:
+        raw = value.encode('utf-8')
+        encoded = COMPRESSED_MARKER + base64.b64encode(zlib.compress(raw, level)).decode('ascii')
+        if len(encoded) < len(raw):
+            return encoded
+    if value.startswith((COMPRESSED_MARKER, ESCAPED_MARKER)):
+        return ESCAPED_MARKER + value
+    return value
+
+
+def decompress_text(value):
+    if not value:
+        return value
+    if value[0] == COMPRESSED_MARKER:
+        return zlib.decompress(base64.b64decode(value[1:])).decode('utf-8')
+    if value[0] == ESCAPED_MARKER:
+        return value[1:]
+    return value
+
+
+def stored_prefix_length(length, worst_case=False):
+    """
+    How many stored characters to read (e.g. with Substr) for
+    decompress_prefix() to return `length` characters. The default is enough
+    for plain values and for compressed ones of up to about a byte per
+    character, which covers prose. worst_case also covers four bytes per
+    character that don't compress at all.
+    """
+    budget = 4 * length + 512 if worst_case else length + 128
+    # The marker, then base64 of `budget` bytes.
+    return 1 + (budget + 2) // 3 * 4
+
+
+def stored_prefix(name, length, worst_case=False):
+    """Substr of field `name` with enough of it for a `length` character preview."""
+    return Substr(name, 1, stored_prefix_length(length, worst_case), output_field=models.TextField())
+
+
+def decompress_prefix(value, length):
+    """The first `length` characters of the text whose stored value starts with `value`."""
+    if not value:
+        return value
+    if value[0] == COMPRESSED_MARKER:
+        data = value[1:len(value) - (len(value) - 1) % 4]
+        raw = zlib.decompressobj().decompress(base64.b64decode(data))
+        # The cut may fall inside a multi-byte character.
+        return raw.decode('utf-8', errors='ignore')[:length]
+    if value[0] == ESCAPED_MARKER:
+        value = value[1:]
+    return value[:length]
+
+
+class CompressedTextField(models.TextField):
+    """
+    TextField that stores values of at least `threshold` characters
+    zlib-compressed, when that makes them smaller.
+    """
+    description = 'Text (compressed above a size threshold)'
+
+    def __init__(self, *args, threshold=1024, level=6, **kwargs):
+        self.threshold = threshold
+        self.level = level
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold != 1024:
+            kwargs['threshold'] = self.threshold
+        if self.level != 6:
+            kwargs['level'] = self.level
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return decompress_text(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return compress_text(value, self.threshold, self.level)
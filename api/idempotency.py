@@ -0,0 +1,107 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+PENDING = 'pending'
+DONE = 'done'
+
+
+def get_idempotency_settings():
+    options = {
+        'TTL': 60 * 60 * 24,
+        'LOCK_TIMEOUT': 30,
+        'WAIT_TIMEOUT': 10,
+        'POLL_INTERVAL': 0.05,
+    }
+    options.update(getattr(settings, 'IDEMPOTENCY', {}))
+    return options
+
+
+def make_digest(value):
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+def idempotency_cache_key(request, key):
+    # Keys are per user and endpoint; hashed so any header value fits the cache.
+    return f'idempotency_{make_digest(f"{request.user.pk}:{request.method}:{request.path}:{key}")}'
+
+
+def payload_hash(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    return make_digest(json.dumps(data, sort_keys=True, default=str))
+
+
+def error_response(message, status_code):
+    return Response({
+        'status': 'error',
+        'message': message
+    }, status=status_code)
+
+
+def idempotent(view_method):
+    """
+    Lets clients retry a view method safely by sending an Idempotency-Key
+    header. The first request with a key claims it with the cache's atomic
+    add() and runs. Its response is then kept for the TTL, along with a hash
+    of the request payload. A retry with the same key and payload gets the
+    stored response back without running the view. A retry with a different
+    payload gets a 422. A retry that arrives while the first is still running
+    waits up to WAIT_TIMEOUT for its result, then gets a 409.
+
+    Server errors and exceptions release the key so the request can be
+    retried for real. Like the throttles, this needs a shared cache (Redis)
+    to hold across processes.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view_method(self, request, *args, **kwargs)
+        if not 1 <= len(key) <= 255:
+            return error_response(f'{HEADER} must be 1 to 255 characters.', status.HTTP_400_BAD_REQUEST)
+
+        options = get_idempotency_settings()
+        cache_key = idempotency_cache_key(request, key)
+        fingerprint = payload_hash(request)
+        deadline = time.monotonic() + options['WAIT_TIMEOUT']
+        while not cache.add(cache_key, (PENDING, fingerprint), options['LOCK_TIMEOUT']):
+            entry = cache.get(cache_key)
+            # None if released or expired since add(): claim it again after
+            # the same wait, so a flapping key can't spin this loop.
+            if entry is not None:
+                if entry[1] != fingerprint:
+                    return error_response(
+                        f'{HEADER} was already used with a different payload.',
+                        status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                if entry[0] == DONE:
+                    response = Response(entry[3], status=entry[2])
+                    response['Idempotent-Replayed'] = 'true'
+                    return response
+            if time.monotonic() >= deadline:
+                return error_response(
+                    f'A request with this {HEADER} is still in progress.', status.HTTP_409_CONFLICT
+                )
+            time.sleep(options['POLL_INTERVAL'])
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except BaseException:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, (DONE, fingerprint, response.status_code, response.data), options['TTL'])
+        return response
+
+    return wrapper
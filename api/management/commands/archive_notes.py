@@ -0,0 +1,28 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.archive import archive_notes
+
+UNITS = {'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_age(value):
+    """'90d', '12w', '36h' or a number of days."""
+    match = re.fullmatch(r'(\d+)([hdw]?)', value.strip())
+    if not match:
+        raise CommandError(f'Invalid age {value!r}, expected e.g. 90d, 12w or 36h')
+    return timedelta(**{UNITS[match[2] or 'd']: int(match[1])})
+
+
+class Command(BaseCommand):
+    help = 'Move notes not updated within --older-than to the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', required=True, help='e.g. 90d, 12w or 36h')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        archived = archive_notes(parse_age(options['older_than']), options['batch_size'])
+        self.stdout.write(f'Archived {archived} notes')
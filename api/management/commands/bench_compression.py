@@ -0,0 +1,54 @@
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from api.fields import compress_text, decompress_text
+
+WORDS = (
+    'the meeting notes for project review include action items owners and '
+    'deadlines we agreed to ship the release after testing on staging then '
+    'follow up with design about onboarding screens budget questions remain '
+    'open TODO check metrics dashboard latency errors customers feedback'
+).split()
+
+
+def sample_text(size, seed=0):
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        if rng.random() < 0.1:
+            word += '.\n' if rng.random() < 0.3 else ','
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size]
+
+
+class Command(BaseCommand):
+    help = 'Measure compression ratio and encode/decode cost of CompressedTextField'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='256,1024,4096,65536,1048576')
+        parser.add_argument('--threshold', type=int, default=1024)
+        parser.add_argument('--level', type=int, default=6)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'size':>9} {'stored':>9} {'ratio':>6} {'encode us':>10} {'decode us':>10}")
+        for size in map(int, options['sizes'].split(',')):
+            text = sample_text(size)
+            stored = compress_text(text, options['threshold'], options['level'])
+            assert decompress_text(stored) == text
+
+            number = max(1, 2_000_000 // size)
+            encode = timeit.timeit(
+                lambda: compress_text(text, options['threshold'], options['level']), number=number
+            ) / number
+            decode = timeit.timeit(lambda: decompress_text(stored), number=number) / number
+
+            raw_size = len(text.encode('utf-8'))
+            self.stdout.write(
+                f'{raw_size:>9} {len(stored):>9} {raw_size / len(stored):>6.2f} '
+                f'{encode * 1e6:>10.1f} {decode * 1e6:>10.1f}'
+            )
@@ -0,0 +1,70 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.management.commands.bench_compression import sample_text
+from api.models import Note, NoteRevision
+from api.revisions import get_snapshot_interval, reconstruct, record_revision
+
+
+def edit(body, rng):
+    """Replace, insert or delete a random line, like a typical note edit."""
+    lines = body.split('\n')
+    index = rng.randrange(len(lines))
+    action = rng.random()
+    if action < 0.6:
+        lines[index] = sample_text(rng.randint(20, 120), seed=rng.random())
+    elif action < 0.9 or len(lines) == 1:
+        lines.insert(index, sample_text(rng.randint(20, 120), seed=rng.random()))
+    else:
+        del lines[index]
+    return '\n'.join(lines)
+
+
+class Command(BaseCommand):
+    help = 'Measure revision storage growth and reconstruction cost (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=20000)
+        parser.add_argument('--edits', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with transaction.atomic():
+            body = sample_text(options['size'])
+            full_copies = 0
+            record_time = 0
+            note = Note.objects.create(body=body)
+            for i in range(options['edits'] + 1):
+                if i:
+                    note.body = body = edit(body, rng)
+                    note.save()
+                # Timed apart from the save, as the queued task runs it.
+                started = time.perf_counter()
+                record_revision(note.pk, note.version, body)
+                record_time += time.perf_counter() - started
+                full_copies += len(body)
+            record_time /= options['edits'] + 1
+
+            revisions = NoteRevision.objects.filter(note=note)
+            stored = sum(len(data) for data in revisions.values_list('data', flat=True))
+            count = revisions.count()
+            self.stdout.write(
+                f'{count} versions of a ~{options["size"]} char note, '
+                f'snapshot interval {get_snapshot_interval()}'
+            )
+            self.stdout.write(f'full copies: {full_copies} chars')
+            self.stdout.write(f'revisions:   {stored} chars ({full_copies / stored:.1f}x smaller)')
+            self.stdout.write(f'record revision: {record_time * 1000:.2f} ms')
+
+            self.stdout.write(f"{'version':>8} {'rebuild ms':>11}")
+            for version in (1, count // 4, count // 2, count - 1, count):
+                started = time.perf_counter()
+                for _ in range(20):
+                    reconstruct(note.pk, version)
+                elapsed = (time.perf_counter() - started) / 20
+                self.stdout.write(f'{version:>8} {elapsed * 1000:>11.2f}')
+
+            transaction.set_rollback(True)
@@ -0,0 +1,138 @@
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Note, NoteBand, Trigram
+from api.trigrams import (
+    extract_trigrams,
+    get_trigram_settings,
+    index_note,
+    search,
+    search_probes,
+    similar,
+)
+
+LETTERS = 'etaoinshrdlcumwfgypbvkjxqz'
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    weights = [1 / rank for rank in range(1, len(LETTERS) + 1)]
+    while len(words) < size:
+        words.add(''.join(rng.choices(LETTERS, weights, k=rng.randint(2, 9))))
+    return list(words)
+
+
+class Corpus:
+    """Notes drawn from a Zipf-distributed vocabulary; some are edits of earlier notes."""
+
+    def __init__(self, vocabulary_size=20000, seed=0):
+        self.rng = random.Random(seed)
+        self.vocabulary = make_vocabulary(vocabulary_size, self.rng)
+        self.weights = [1 / rank for rank in range(1, vocabulary_size + 1)]
+        self.bodies = []
+
+    def words(self, count):
+        return self.rng.choices(self.vocabulary, self.weights, k=count)
+
+    def next_body(self):
+        if self.bodies and self.rng.random() < 0.2:
+            # An edited copy: about a fifth of the words replaced.
+            words = self.rng.choice(self.bodies).split()
+            for _ in range(len(words) // 5):
+                words[self.rng.randrange(len(words))] = self.words(1)[0]
+        else:
+            words = self.words(self.rng.randint(40, 200))
+        body = ' '.join(words)
+        self.bodies.append(body)
+        return body
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def scan_similar(note_id, bodies, threshold, limit):
+    """The pairwise baseline: Jaccard against every note's body."""
+    trigrams = extract_trigrams(bodies[note_id])
+    matches = []
+    for other_id, body in bodies.items():
+        if other_id == note_id:
+            continue
+        other = extract_trigrams(body)
+        shared = len(trigrams & other)
+        score = shared / (len(trigrams) + len(other) - shared)
+        if score >= threshold:
+            matches.append((other_id, score))
+    matches.sort(key=lambda match: (-match[1], -match[0]))
+    return matches[:limit]
+
+
+class Command(BaseCommand):
+    help = 'Measure trigram search and similar-note lookups against corpus size (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,2000,4000')
+        parser.add_argument('--queries', type=int, default=30)
+        parser.add_argument('--scan-queries', type=int, default=10)
+
+    def handle(self, *args, **options):
+        corpus = Corpus()
+        rng = random.Random(1)
+        trigram_settings = get_trigram_settings()
+        self.stdout.write(
+            f"{'notes':>6} {'similar ms':>11} {'postings':>9} {'found':>7} {'scan ms':>8} "
+            f"{'search ms':>10} {'postings':>9} {'index rows':>11}"
+        )
+        with transaction.atomic():
+            bodies = {}
+            for size in map(int, options['sizes'].split(',')):
+                while len(bodies) < size:
+                    note = Note.objects.create(body=corpus.next_body())
+                    index_note(note)
+                    bodies[note.pk] = note.body
+                frequencies = dict(Trigram.objects.values_list('trigram', 'note_count'))
+                note_ids = rng.sample(sorted(bodies), options['queries'])
+
+                similar_ms = similar_postings = 0
+                for note_id in note_ids:
+                    _, elapsed = timed(similar, note_id)
+                    similar_ms += elapsed
+                    buckets = NoteBand.objects.filter(note_id=note_id).values('bucket')
+                    similar_postings += NoteBand.objects.filter(bucket__in=buckets).count()
+
+                # Recall against the pairwise scan, which also gives its cost.
+                scan_ms = found = expected = 0
+                for note_id in note_ids[:options['scan_queries']]:
+                    exact, elapsed = timed(scan_similar, note_id, bodies, trigram_settings['SIMILAR_THRESHOLD'], 10)
+                    scan_ms += elapsed
+                    expected += len(exact)
+                    found += len({match[0] for match in similar(note_id)} & {match[0] for match in exact})
+
+                search_ms = search_postings = 0
+                for note_id in note_ids:
+                    # A few words of a note, with a typo.
+                    words = bodies[note_id].split()
+                    start = rng.randrange(max(1, len(words) - 3))
+                    query = ' '.join(words[start:start + 3])
+                    position = rng.randrange(len(query))
+                    query = query[:position] + query[position + 1:]
+                    _, elapsed = timed(search, query)
+                    search_ms += elapsed
+                    trigrams = extract_trigrams(query)
+                    required = math.ceil(trigram_settings['SEARCH_THRESHOLD'] * len(trigrams))
+                    search_postings += sum(frequencies[trigram] for trigram in search_probes(trigrams, required))
+
+                queries = len(note_ids)
+                self.stdout.write(
+                    f'{size:>6} {similar_ms / queries:>11.2f} {similar_postings // queries:>9} '
+                    f'{f"{found}/{expected}":>7} {scan_ms / options["scan_queries"]:>8.1f} '
+                    f'{search_ms / queries:>10.2f} {search_postings // queries:>9} '
+                    f'{sum(frequencies.values()):>11}'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Note
+from api.trigrams import index_note
+
+
+class Command(BaseCommand):
+    help = 'Add notes that are missing from the trigram index (or all of them with --rebuild)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        notes = Note.objects.order_by('pk')
+        if not options['rebuild']:
+            notes = notes.filter(trigram_index__isnull=True)
+
+        indexed = 0
+        last_pk = 0
+        while True:
+            batch = list(notes.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            for note in batch:
+                index_note(note)
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+            self.stdout.write(f'{indexed} notes indexed')
+        self.stdout.write(f'Done: {indexed} notes indexed')
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Write the OpenAPI schema served by /swagger.json/, /swagger/ and /redoc/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.OPENAPI_SCHEMA_FILE))
+
+    def handle(self, *args, **options):
+        from config.docs import write_artifact
+
+        documents = write_artifact(options['output'])
+        self.stdout.write(
+            f"Wrote {options['output']} for URLconf {documents['fingerprint']} "
+            f"({len(documents['json'])} bytes JSON)"
+        )
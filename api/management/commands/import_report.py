@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+STARTUP_SCRIPT = '''
+import {module}
+from django.urls import get_resolver
+get_resolver().url_patterns
+'''
+
+
+def measure_imports(module):
+    """
+    Import `module` and the URLconf in a fresh interpreter with -X importtime.
+    Returns (module, self_us, cumulative_us, parent) tuples in import order.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT.format(module=module)],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    rows = []
+    # importtime prints children before their parent; the indentation of the
+    # name gives the nesting depth.
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        rows.append([name, int(self_us), int(cumulative_us), depth])
+    # Resolve parents: the next row with a smaller depth imported this one.
+    for i, row in enumerate(rows):
+        parent = next((later[0] for later in rows[i + 1:] if later[3] < row[3]), '')
+        row[3] = parent
+    return [tuple(row) for row in rows]
+
+
+class Command(BaseCommand):
+    help = 'Report what each module and package costs at server startup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='config.wsgi')
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows = measure_imports(options['module'])
+        limit = options['limit']
+
+        packages = defaultdict(lambda: [0, 0])
+        for name, self_us, _, _ in rows:
+            package = packages[name.split('.')[0]]
+            package[0] += self_us
+            package[1] += 1
+        total = sum(self_us for _, self_us, _, _ in rows)
+        self.stdout.write(f'{len(rows)} modules imported in {total / 1000:.1f} ms\n')
+
+        self.stdout.write(f"{'package':<32} {'ms':>8} {'modules':>8}")
+        for package, (self_us, count) in sorted(packages.items(), key=lambda item: -item[1][0])[:limit]:
+            self.stdout.write(f'{package:<32} {self_us / 1000:>8.1f} {count:>8}')
+
+        self.stdout.write(f"\n{'module (cumulative)':<48} {'ms':>8}  imported by")
+        for name, _, cumulative_us, parent in sorted(rows, key=lambda row: -row[2])[:limit]:
+            self.stdout.write(f'{name:<48} {cumulative_us / 1000:>8.1f}  {parent}')
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.tasks import get_queue_settings, make_worker_id, requeue_stale_tasks, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Run background task workers until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=get_queue_settings()['WORKERS'])
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_tasks()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale tasks')
+
+        if options['once']:
+            processed = 0
+            while True:
+                count = run_pending()
+                if not count:
+                    break
+                processed += count
+            self.stdout.write(f'Processed {processed} tasks')
+            return
+
+        stopped = threading.Event()
+        threads = [
+            threading.Thread(target=self.work, args=(stopped, options['interval']), daemon=True)
+            for _ in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f'Started {len(threads)} workers')
+        try:
+            while True:
+                time.sleep(get_queue_settings()['STALE_AFTER'])
+                requeue_stale_tasks()
+        except KeyboardInterrupt:
+            stopped.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self, stopped, interval):
+        worker_id = make_worker_id()
+        try:
+            while not stopped.is_set():
+                if not run_pending(worker_id):
+                    stopped.wait(interval)
+        finally:
+            connection.close()
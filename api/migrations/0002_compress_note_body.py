@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:36
+
+import api.fields
+from django.db import migrations
+
+
+def compress_bodies(apps, schema_editor):
+    # Saving through the new field compresses bodies above its threshold.
+    # update() is used so that `updated` is left alone.
+    Note = apps.get_model('api', 'Note')
+    for pk, body in Note.objects.values_list('pk', 'body').iterator():
+        Note.objects.filter(pk=pk).update(body=body)
+
+
+def decompress_bodies(apps, schema_editor):
+    Note = apps.get_model('api', 'Note')
+    with schema_editor.connection.cursor() as cursor:
+        for pk, body in Note.objects.values_list('pk', 'body').iterator():
+            cursor.execute(
+                'UPDATE api_note SET body = %s WHERE id = %s', [body, pk]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='note',
+            options={'ordering': ['-updated'], 'verbose_name': 'Note', 'verbose_name_plural': 'Notes'},
+        ),
+        migrations.AlterField(
+            model_name='note',
+            name='body',
+            field=api.fields.CompressedTextField(blank=True, null=True),
+        ),
+        migrations.RunPython(compress_bodies, decompress_bodies),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:41
+
+import api.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_compress_note_body'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('is_snapshot', models.BooleanField(default=False)),
+                ('data', api.fields.CompressedTextField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='api.note')),
+            ],
+            options={
+                'ordering': ['note', 'version'],
+                'constraints': [models.UniqueConstraint(fields=('note', 'version'), name='unique_note_version')],
+            },
+        ),
+    ]
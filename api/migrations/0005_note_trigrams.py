@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedNote',
+            fields=[
+                ('note', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trigram_index', serialize=False, to='api.note')),
+                ('trigram_count', models.PositiveIntegerField()),
+                ('indexed', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Trigram',
+            fields=[
+                ('trigram', models.CharField(max_length=3, primary_key=True, serialize=False)),
+                ('note_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NoteBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField()),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='api.note')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket', 'note'], name='api_noteban_bucket_863dfa_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='NoteTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='api.note')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'note'], name='api_notetri_trigram_09b229_idx')],
+                'constraints': [models.UniqueConstraint(fields=('note', 'trigram'), name='unique_note_trigram')],
+            },
+        ),
+    ]
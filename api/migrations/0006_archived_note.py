@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:15
+
+import api.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_note_trigrams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNote',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('body', api.fields.CompressedTextField(blank=True, null=True)),
+                ('updated', models.DateTimeField()),
+                ('created', models.DateTimeField()),
+                ('archived', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-updated'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='noterevision',
+            name='note',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='revisions', to='api.note'),
+        ),
+    ]
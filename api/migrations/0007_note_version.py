@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_archived_note'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivednote',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
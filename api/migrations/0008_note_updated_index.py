@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_note_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='note',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
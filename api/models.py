@@ -1,10 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.utils import timezone
+from .fields import CompressedTextField
 
 class Note(models.Model):
-    body = models.TextField(null=True, blank=True)
-    updated = models.DateTimeField(auto_now=True)
+    body = CompressedTextField(null=True, blank=True)
+    # Indexed for the list ordering and the admin's date_hierarchy.
+    updated = models.DateTimeField(auto_now=True, db_index=True)
     created = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save; clients send it back to detect conflicts (api.sync).
+    # Each version is also the version of its NoteRevision.
+    version = models.PositiveIntegerField(default=1)
 
     class Meta:
         ordering = ['-updated']
@@ -12,4 +18,150 @@ class Note(models.Model):
         verbose_name_plural = 'Notes'
 
     def __str__(self):
-        return self.body[:50] + '...' if len(self.body) > 50 else self.body
\ No newline at end of file
+        return self.body[:50] + '...' if len(self.body) > 50 else self.body
+
+    def save(self, *args, **kwargs):
+        # One transaction with the revision recorded on post_save (api.signals).
+        with transaction.atomic(using=kwargs.get('using')):
+            if not self._state.adding:
+                self.bump_version(kwargs.get('using'))
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+            super().save(*args, **kwargs)
+
+    def bump_version(self, using=None):
+        """
+        Increment the version in SQL rather than from this instance, which
+        may have been loaded before another save.
+        """
+        rows = type(self)._base_manager.using(using).filter(pk=self.pk)
+        if rows.update(version=F('version') + 1):
+            self.version = rows.values_list('version', flat=True).get()
+
+
+class ArchivedNote(models.Model):
+    """
+    A note not updated for a while, moved out of api_note by
+    `manage.py archive_notes` (see api.archive). Keeps the note's id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    body = CompressedTextField(null=True, blank=True)
+    updated = models.DateTimeField()
+    created = models.DateTimeField()
+    version = models.PositiveIntegerField(default=1)
+    archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-updated']
+
+    def __str__(self):
+        return f'{self.pk} (archived)'
+
+
+class NoteRevision(models.Model):
+    """
+    One saved version of a note. Snapshots hold the full body, the other
+    revisions a line delta against the previous version (see api.revisions).
+    """
+    # No database constraint, so revisions stay while their note is archived
+    # (see api.archive); api.signals deletes them with the note.
+    note = models.ForeignKey(
+        Note, on_delete=models.DO_NOTHING, db_constraint=False, related_name='revisions'
+    )
+    version = models.PositiveIntegerField()
+    is_snapshot = models.BooleanField(default=False)
+    data = CompressedTextField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['note', 'version']
+        constraints = [
+            models.UniqueConstraint(fields=['note', 'version'], name='unique_note_version'),
+        ]
+
+    def __str__(self):
+        return f'{self.note_id} v{self.version}'
+
+
+class Task(models.Model):
+    """A deferred side effect, run by api.tasks workers after commit."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+class Trigram(models.Model):
+    """How many indexed notes contain a trigram (see api.trigrams)."""
+    trigram = models.CharField(max_length=3, primary_key=True)
+    note_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.trigram!r} ({self.note_count})'
+
+
+class NoteTrigram(models.Model):
+    """Inverted index row: `note` contains `trigram`."""
+    trigram = models.CharField(max_length=3)
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='trigrams')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['note', 'trigram'], name='unique_note_trigram'),
+        ]
+        indexes = [
+            models.Index(fields=['trigram', 'note']),
+        ]
+
+    def __str__(self):
+        return f'{self.note_id} {self.trigram!r}'
+
+
+class IndexedNote(models.Model):
+    """A note whose trigrams are in the index, and how many there are."""
+    note = models.OneToOneField(Note, on_delete=models.CASCADE, primary_key=True, related_name='trigram_index')
+    trigram_count = models.PositiveIntegerField()
+    indexed = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.note_id} ({self.trigram_count} trigrams)'
+
+
+class NoteBand(models.Model):
+    """
+    MinHash LSH bucket of a note (see api.trigrams.similar): notes sharing a
+    bucket agree on one band of their MinHash signatures.
+    """
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='bands')
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket', 'note']),
+        ]
+
+    def __str__(self):
+        return f'{self.note_id} {self.bucket}'
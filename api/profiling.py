@@ -0,0 +1,181 @@
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.utils.text import slugify
+
+PROFILE_SALT = 'api.profiling'
+PROFILE_SUFFIX = '.folded'
+
+
+def get_profiling_settings():
+    options = {
+        'SAMPLE_RATE': 0.0,
+        'INTERVAL': 0.005,
+        'DIRECTORY': os.path.join(settings.BASE_DIR, 'profiles'),
+        'MAX_FILES': 100,
+        'HEADER': 'X-Profile-Token',
+        'TOKEN_MAX_AGE': 60 * 60,
+    }
+    options.update(getattr(settings, 'PROFILING', {}))
+    return options
+
+
+def make_profile_token():
+    """Signed value for the profiling header, valid for TOKEN_MAX_AGE seconds."""
+    return signing.TimestampSigner(salt=PROFILE_SALT).sign('profile')
+
+
+def check_profile_token(token, max_age):
+    try:
+        signing.TimestampSigner(salt=PROFILE_SALT).unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the call stack of another thread at a fixed interval.
+
+    Unlike cProfile nothing is hooked into the profiled thread, so the cost
+    is one stack walk per interval regardless of how many calls it makes.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self._stack(frame)] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    @staticmethod
+    def _stack(frame):
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            filename = os.path.basename(code.co_filename)
+            frames.append(f'{code.co_name} ({filename}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(frames))
+
+
+def write_profile(samples, request, elapsed, options):
+    """
+    Store samples in the folded stack format read by flamegraph.pl and
+    speedscope, then drop the oldest files beyond MAX_FILES.
+    """
+    directory = options['DIRECTORY']
+    os.makedirs(directory, exist_ok=True)
+    name = '{}-{}ms-{}-{}-{}{}'.format(
+        time.strftime('%Y%m%d-%H%M%S'),
+        int(elapsed * 1000),
+        request.method,
+        slugify(request.path)[:50] or 'root',
+        uuid.uuid4().hex[:8],
+        PROFILE_SUFFIX,
+    )
+    with open(os.path.join(directory, name), 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+    rotate_profiles(directory, options['MAX_FILES'])
+    return name
+
+
+def rotate_profiles(directory, max_files):
+    profiles = list_profiles(directory)
+    for profile in profiles[max_files:]:
+        os.remove(os.path.join(directory, profile['name']))
+
+
+def list_profiles(directory):
+    """Stored profiles, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(PROFILE_SUFFIX):
+            stat = entry.stat()
+            profiles.append({
+                'name': entry.name,
+                'size': stat.st_size,
+                'modified': stat.st_mtime,
+            })
+    profiles.sort(key=lambda profile: (profile['modified'], profile['name']), reverse=True)
+    return profiles
+
+
+def read_profile(directory, name):
+    if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+        raise FileNotFoundError(name)
+    with open(os.path.join(directory, name)) as f:
+        return f.read()
+
+
+def summarize_profile(folded, limit=30):
+    """Per-function self and total sample counts from folded stacks."""
+    own = Counter()
+    total = Counter()
+    samples = 0
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if not stack:
+            continue
+        count = int(count)
+        frames = stack.split(';')
+        samples += count
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    rows = [
+        {'function': function, 'total': count, 'self': own[function]}
+        for function, count in total.most_common(limit)
+    ]
+    return samples, rows
+
+
+class SamplingProfilerMiddleware:
+    """
+    Profiles a random sample of requests (PROFILING['SAMPLE_RATE']) and any
+    request carrying a valid signed token in PROFILING['HEADER'].
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = get_profiling_settings()
+        if not self.should_profile(request, options):
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), options['INTERVAL'])
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        write_profile(sampler.samples, request, time.perf_counter() - started, options)
+        return response
+
+    def should_profile(self, request, options):
+        token = request.headers.get(options['HEADER'])
+        if token and check_profile_token(token, options['TOKEN_MAX_AGE']):
+            return True
+        return random.random() < options['SAMPLE_RATE']
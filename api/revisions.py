@@ -0,0 +1,127 @@
+import difflib
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import ArchivedNote, Note, NoteRevision
+from .tasks import task
+
+
+def get_snapshot_interval():
+    """Maximum number of deltas applied to rebuild any version."""
+    return getattr(settings, 'NOTE_REVISION_SNAPSHOT_INTERVAL', 10)
+
+
+def make_delta(old, new):
+    """
+    Line delta turning `old` into `new`, as a JSON list where a positive
+    integer copies that many lines of `old`, a negative one skips lines of
+    `old` and a string is inserted as is.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    ops = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(i1 - i2)
+        if j2 > j1:
+            ops.append(''.join(new_lines[j1:j2]))
+    return json.dumps(ops, separators=(',', ':'))
+
+
+def apply_delta(old, delta):
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    position = 0
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.extend(old_lines[position:position + op])
+            position += op
+        else:
+            position -= op
+    return ''.join(parts)
+
+
+def get_revision_chain(note_id, version):
+    """The closest snapshot at or before `version` and the deltas up to it."""
+    snapshot = (
+        NoteRevision.objects
+        .filter(note_id=note_id, version__lte=version, is_snapshot=True)
+        .order_by('-version')
+        .first()
+    )
+    if snapshot is None:
+        raise NoteRevision.DoesNotExist
+    deltas = list(
+        NoteRevision.objects
+        .filter(note_id=note_id, version__gt=snapshot.version, version__lte=version)
+        .order_by('version')
+    )
+    if (deltas[-1].version if deltas else snapshot.version) != version:
+        raise NoteRevision.DoesNotExist
+    return snapshot, deltas
+
+
+def reconstruct(note_id, version):
+    """Body of the note as it was at `version`."""
+    snapshot, deltas = get_revision_chain(note_id, version)
+    body = snapshot.data
+    for revision in deltas:
+        body = apply_delta(body, revision.data)
+    return body
+
+
+@transaction.atomic
+def record_revision(note_id, version, body):
+    """
+    Store `body` as the revision of `version` of the note, unless that
+    version is recorded already. Returns the new revision or None.
+
+    A delta is always against the previous version. Tasks may record
+    versions out of order, so a version whose predecessor isn't recorded
+    yet is stored as a snapshot instead.
+    """
+    body = body or ''
+    if NoteRevision.objects.filter(note_id=note_id, version=version).exists():
+        # A restored note keeps its version, which is recorded already.
+        return None
+    revision = NoteRevision(note_id=note_id, version=version, is_snapshot=True, data=body)
+    try:
+        snapshot, deltas = get_revision_chain(note_id, version - 1)
+    except NoteRevision.DoesNotExist:
+        revision.save()
+        return revision
+
+    previous = snapshot.data
+    for delta in deltas:
+        previous = apply_delta(previous, delta.data)
+    delta = make_delta(previous, body)
+    if len(deltas) + 1 < get_snapshot_interval() and len(delta) < len(body):
+        revision.is_snapshot = False
+        revision.data = delta
+    revision.save()
+    return revision
+
+
+@task('record_revisions', batch=True)
+def record_revisions(payloads):
+    """
+    Deferred from Note saves, with the version and body each save wrote.
+    Versions of a note queued together are recorded in order; those of
+    notes deleted since are dropped.
+    """
+    note_ids = {payload['note_id'] for payload in payloads}
+    existing = {
+        *Note.objects.filter(pk__in=note_ids).values_list('pk', flat=True),
+        *ArchivedNote.objects.filter(pk__in=note_ids).values_list('pk', flat=True),
+    }
+    for payload in sorted(payloads, key=lambda payload: (payload['note_id'], payload['version'])):
+        if payload['note_id'] in existing:
+            record_revision(payload['note_id'], payload['version'], payload['body'])
@@ -1,7 +1,11 @@
 from rest_framework.serializers import ModelSerializer
-from .models import Note
+from .models import Note, NoteRevision
 from rest_framework import serializers
 
+# Largest id or version a bigint column holds; larger ones overflow the
+# database driver instead of just matching nothing.
+MAX_BIGINT = 2 ** 63 - 1
+
 
 class NoteSerializer(serializers.ModelSerializer):
     body = serializers.CharField(required=True, allow_blank=False)
@@ -9,6 +13,14 @@ class NoteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Note
         fields = '__all__'
+        read_only_fields = ['version']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only these fields, e.g. from NoteListSerializer.
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
     def validate_body(self, value):
         if not value.strip():
@@ -16,3 +28,83 @@ class NoteSerializer(serializers.ModelSerializer):
         return value
 
 
+class NoteRevisionSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = NoteRevision
+        fields = ['version', 'is_snapshot', 'created']
+
+
+class NoteRevertSerializer(serializers.Serializer):
+    version = serializers.IntegerField(min_value=1, max_value=MAX_BIGINT)
+
+
+class NoteSearchSerializer(serializers.Serializer):
+    q = serializers.CharField()
+    threshold = serializers.FloatField(min_value=0.1, max_value=1, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class NoteListSerializer(serializers.Serializer):
+    """
+    List options: fields (comma-separated NoteSerializer fields) and preview
+    (the length to cut bodies to).
+    """
+    fields = serializers.CharField(required=False)
+    preview = serializers.IntegerField(min_value=1, max_value=10000, required=False)
+    include_archived = serializers.BooleanField(default=False)
+
+    def validate_fields(self, value):
+        names = {name.strip() for name in value.split(',')}
+        available = list(NoteSerializer().fields)
+        unknown = names - set(available)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+        # Canonical order, so equal selections share a cache entry.
+        return [name for name in available if name in names]
+
+
+class NoteSimilarSerializer(serializers.Serializer):
+    threshold = serializers.FloatField(min_value=0.01, max_value=1, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class NoteOperationSerializer(serializers.Serializer):
+    """
+    One offline change: create (body), update (id, base_version, body) or
+    delete (id, base_version). base_version is the note version the client
+    last saw.
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    REQUIRED = {
+        CREATE: ['body'],
+        UPDATE: ['id', 'base_version', 'body'],
+        DELETE: ['id', 'base_version'],
+    }
+
+    op = serializers.ChoiceField(choices=[CREATE, UPDATE, DELETE])
+    id = serializers.IntegerField(min_value=1, max_value=MAX_BIGINT, required=False)
+    base_version = serializers.IntegerField(min_value=1, max_value=MAX_BIGINT, required=False)
+    body = serializers.CharField(required=False, allow_blank=False)
+    client_id = serializers.CharField(max_length=64, required=False)
+
+    def validate_body(self, value):
+        if not value.strip():
+            raise serializers.ValidationError("Body cannot be empty.")
+        return value
+
+    def validate(self, attrs):
+        missing = [field for field in self.REQUIRED[attrs['op']] if field not in attrs]
+        if missing:
+            raise serializers.ValidationError({field: 'This field is required.' for field in missing})
+        return attrs
+
+
+class NoteSyncSerializer(serializers.Serializer):
+    MAX_OPERATIONS = 500
+
+    operations = serializers.ListField(
+        child=NoteOperationSerializer(), allow_empty=False, max_length=MAX_OPERATIONS
+    )
@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import revisions  # noqa: F401  registers the record_revisions task
+from .archive import is_archiving
+from .cache import invalidate_note_lists
+from .models import Note, NoteRevision
+from .tasks import enqueue
+from .trigrams import unindex_note
+
+
+@receiver(post_save, sender=Note)
+def record_note_revision(sender, instance, raw=False, **kwargs):
+    # The body is queued as saved, so later saves can't replace it.
+    if not raw:
+        enqueue('record_revisions', note_id=instance.pk, version=instance.version, body=instance.body)
+
+
+@receiver(post_save, sender=Note)
+def index_note_trigrams(sender, instance, raw=False, **kwargs):
+    if not raw:
+        enqueue('index_trigrams', note_id=instance.pk)
+
+
+@receiver(pre_delete, sender=Note)
+def unindex_deleted_note(sender, instance, **kwargs):
+    unindex_note(instance.pk)
+
+
+@receiver(post_delete, sender=Note)
+def delete_note_revisions(sender, instance, **kwargs):
+    # Archived notes keep their history.
+    if not is_archiving():
+        NoteRevision.objects.filter(note_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_note_cache(sender, instance, **kwargs):
+    # Also covers writes outside the views (sync, admin, revert), so a stale
+    # cached copy can't be saved over a newer version.
+    cache.delete(f'note_{instance.pk}')
+    invalidate_note_lists()
@@ -0,0 +1,72 @@
+from django.db import transaction
+
+from .archive import get_archived_note, restore_note
+from .models import ArchivedNote, Note
+from .serializers import NoteOperationSerializer
+
+CREATE = NoteOperationSerializer.CREATE
+UPDATE = NoteOperationSerializer.UPDATE
+DELETE = NoteOperationSerializer.DELETE
+
+
+@transaction.atomic
+def apply_operations(operations):
+    """
+    Apply validated NoteOperationSerializer data in order, in one transaction.
+
+    An update or delete whose base_version isn't the note's current version,
+    or an update of a deleted note, is a conflict: it is skipped and the rest
+    still apply. Operations on the same note chain, so a second update of a
+    note should be based on the version the first one produces.
+
+    Returns (applied, conflicts, notes) where `notes` maps the id of every
+    note the operations touched to its current state, or None if it's gone.
+    """
+    ids = {operation['id'] for operation in operations if 'id' in operation}
+    notes = Note.objects.select_for_update().in_bulk(ids)
+    archived = ArchivedNote.objects.in_bulk(ids - notes.keys())
+
+    applied = []
+    conflicts = []
+    touched = {}
+    for index, operation in enumerate(operations):
+        result = {'index': index, 'op': operation['op']}
+        if 'client_id' in operation:
+            result['client_id'] = operation['client_id']
+
+        if operation['op'] == CREATE:
+            note = Note.objects.create(body=operation['body'])
+            notes[note.pk] = touched[note.pk] = note
+            applied.append({**result, 'id': note.pk, 'version': note.version})
+            continue
+
+        pk = result['id'] = operation['id']
+        current = notes.get(pk) or archived.get(pk)
+        if current is None:
+            touched[pk] = None
+            if operation['op'] == DELETE:
+                # Already gone, which is what the client wanted.
+                applied.append({**result, 'version': None})
+            else:
+                conflicts.append({**result, 'reason': 'deleted', 'version': None})
+            continue
+        if current.version != operation['base_version']:
+            touched[pk] = notes.get(pk) or get_archived_note(pk)
+            conflicts.append({**result, 'reason': 'version', 'version': current.version})
+            continue
+
+        if pk in archived:
+            notes[pk] = restore_note(pk)
+            del archived[pk]
+        note = notes[pk]
+        if operation['op'] == UPDATE:
+            note.body = operation['body']
+            note.save()
+            touched[pk] = note
+            applied.append({**result, 'version': note.version})
+        else:
+            note.delete()
+            del notes[pk]
+            touched[pk] = None
+            applied.append({**result, 'version': None})
+    return applied, conflicts, touched
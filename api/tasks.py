@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+_wakeup = threading.Event()
+
+
+def get_queue_settings():
+    options = {
+        'IN_PROCESS': True,
+        'WORKERS': 2,
+        'BATCH_SIZE': 50,
+        'MAX_ATTEMPTS': 5,
+        'RETRY_DELAY': 2,
+        'STALE_AFTER': 300,
+    }
+    options.update(getattr(settings, 'TASK_QUEUE', {}))
+    return options
+
+
+def task(name, batch=False):
+    """
+    Register a task handler. Batch handlers are called once per claimed batch
+    with the list of distinct payloads, others once per task with **payload.
+    """
+    def decorator(func):
+        _registry[name] = (func, batch)
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    """
+    Store a task in the current transaction. Workers in this process are
+    woken once it commits; `manage.py run_workers` picks it up otherwise.
+    """
+    Task.objects.create(name=name, payload=payload)
+    if get_queue_settings()['IN_PROCESS']:
+        transaction.on_commit(wake_workers)
+
+
+def wake_workers():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = get_queue_settings()['WORKERS']
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='task-worker')
+            _slots = threading.BoundedSemaphore(workers)
+    _wakeup.set()
+    if _slots.acquire(blocking=False):
+        _executor.submit(_worker_loop)
+
+
+def _worker_loop():
+    while True:
+        _wakeup.clear()
+        try:
+            while run_pending():
+                pass
+        except Exception:
+            logger.exception('Task worker failed')
+        finally:
+            _slots.release()
+            connection.close()
+        # A wake-up that arrived while every slot was busy would otherwise be lost.
+        if not (_wakeup.is_set() and _slots.acquire(blocking=False)):
+            return
+
+
+def make_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'[:64]
+
+
+def claim_tasks(worker_id, limit):
+    now = timezone.now()
+    ids = list(
+        Task.objects
+        .filter(status=Task.PENDING, run_after__lte=now)
+        .values_list('pk', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    Task.objects.filter(pk__in=ids, status=Task.PENDING).update(
+        status=Task.RUNNING, claimed_by=worker_id, claimed_at=now
+    )
+    return list(Task.objects.filter(pk__in=ids, status=Task.RUNNING, claimed_by=worker_id))
+
+
+def requeue_stale_tasks():
+    """Release tasks claimed by workers that died before finishing them."""
+    cutoff = timezone.now() - timedelta(seconds=get_queue_settings()['STALE_AFTER'])
+    return Task.objects.filter(status=Task.RUNNING, claimed_at__lt=cutoff).update(
+        status=Task.PENDING, claimed_by='', claimed_at=None
+    )
+
+
+def run_pending(worker_id=None):
+    """Claim and run one batch of due tasks. Returns the number claimed."""
+    options = get_queue_settings()
+    tasks = claim_tasks(worker_id or make_worker_id(), options['BATCH_SIZE'])
+
+    groups = {}
+    for claimed in tasks:
+        groups.setdefault(claimed.name, []).append(claimed)
+    for name, group in groups.items():
+        _run_group(name, group, options)
+    return len(tasks)
+
+
+def _run_group(name, group, options):
+    if name not in _registry:
+        _fail(group, f'Unknown task {name!r}', options, retry=False)
+        return
+    func, batch = _registry[name]
+
+    if batch:
+        payloads = {json.dumps(t.payload, sort_keys=True): t.payload for t in group}
+        try:
+            func(list(payloads.values()))
+        except Exception:
+            _fail(group, traceback.format_exc(), options)
+        else:
+            Task.objects.filter(pk__in=[t.pk for t in group]).delete()
+        return
+
+    for claimed in group:
+        try:
+            func(**claimed.payload)
+        except Exception:
+            _fail([claimed], traceback.format_exc(), options)
+        else:
+            claimed.delete()
+
+
+def _fail(group, error, options, retry=True):
+    logger.warning('Task %s failed: %s', group[0].name, error)
+    now = timezone.now()
+    for failed in group:
+        failed.attempts += 1
+        failed.last_error = error
+        failed.claimed_by = ''
+        failed.claimed_at = None
+        if retry and failed.attempts < options['MAX_ATTEMPTS']:
+            failed.status = Task.PENDING
+            failed.run_after = now + timedelta(
+                seconds=options['RETRY_DELAY'] * 2 ** (failed.attempts - 1)
+            )
+        else:
+            failed.status = Task.FAILED
+        failed.save()
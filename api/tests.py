@@ -1,14 +1,46 @@
-from django.test import TestCase, Client
+from django.test import SimpleTestCase, TestCase, Client, override_settings
+from django.contrib import admin
 from django.urls import reverse
 from django.utils.formats import date_format 
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APIRequestFactory, APITestCase, APIClient
 from rest_framework import status
-from .models import Note
+from .models import ArchivedNote, IndexedNote, Note, NoteRevision, NoteTrigram, Task, Trigram
 from .serializers import NoteSerializer
 import json
+import random
 from django.conf import settings
-from datetime import datetime
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from datetime import datetime, timedelta
+from django.utils import timezone
+from unittest import skipIf
+from unittest.mock import patch
+import gzip
+from io import StringIO
+import os
+import subprocess
+import sys
+import shutil
+import tempfile
+import threading
+import time
+from . import compression
+from .compression import brotli
+from .fields import COMPRESSED_MARKER, compress_text, decompress_prefix, decompress_text, stored_prefix_length
+from .admin import EstimatedCountPaginator, NoteAdmin
+from .archive import analyze, archive_notes
+from . import idempotency
+from .idempotency import idempotency_cache_key, make_digest
+from .tasks import enqueue, run_pending, task
+from .throttling import SlidingWindowThrottle
+from . import trigrams
+from .trigrams import extract_trigrams
+from .revisions import apply_delta, make_delta, reconstruct, record_revision
+from .views import read_previews, warm_caches
+from .profiling import list_profiles, make_profile_token, summarize_profile
 
 User = get_user_model()
 
@@ -255,4 +287,1303 @@ class NoteAdminTestCase(TestCase):
         url = reverse('admin:api_note_change', args=[self.note.id])
         response = self.client.get(url)
         
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+class SamplingProfilerTestCase(TestCase):
+    """Test suite for the sampling profiler middleware and its admin views"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.options = {
+            'SAMPLE_RATE': 0.0,
+            'INTERVAL': 0.001,
+            'DIRECTORY': self.directory,
+            'MAX_FILES': 2,
+            'HEADER': 'X-Profile-Token',
+            'TOKEN_MAX_AGE': 60,
+        }
+        self.list_url = reverse('note-list-create')
+
+    def test_unsampled_request_is_not_profiled(self):
+        """Test that requests are not profiled by default"""
+        with self.settings(PROFILING=self.options):
+            self.client.get(self.list_url)
+        self.assertEqual(list_profiles(self.directory), [])
+
+    def test_signed_header_profiles_request(self):
+        """Test that a valid signed header profiles the request"""
+        with self.settings(PROFILING=self.options):
+            self.client.get(self.list_url, HTTP_X_PROFILE_TOKEN=make_profile_token())
+        profiles = list_profiles(self.directory)
+        self.assertEqual(len(profiles), 1)
+        self.assertIn('-GET-notes-', profiles[0]['name'])
+
+    def test_forged_header_is_ignored(self):
+        """Test that an unsigned header does not enable profiling"""
+        with self.settings(PROFILING=self.options):
+            self.client.get(self.list_url, HTTP_X_PROFILE_TOKEN='profile')
+        self.assertEqual(list_profiles(self.directory), [])
+
+    def test_profiles_are_rotated(self):
+        """Test that only MAX_FILES profiles are kept"""
+        with self.settings(PROFILING={**self.options, 'SAMPLE_RATE': 1.0}):
+            for _ in range(4):
+                self.client.get(self.list_url)
+        self.assertEqual(len(list_profiles(self.directory)), 2)
+
+    def test_summarize_profile(self):
+        """Test per-function self and total counts"""
+        samples, rows = summarize_profile('a;b 3\na;c 1\n')
+        self.assertEqual(samples, 4)
+        self.assertEqual(rows[0], {'function': 'a', 'total': 4, 'self': 0})
+        self.assertIn({'function': 'b', 'total': 3, 'self': 3}, rows)
+
+    def test_admin_views_require_staff(self):
+        """Test that profiles are only browsable by staff"""
+        with self.settings(PROFILING=self.options):
+            self.client.get(self.list_url, HTTP_X_PROFILE_TOKEN=make_profile_token())
+            name = list_profiles(self.directory)[0]['name']
+            detail_url = reverse('profile-detail', args=[name])
+
+            response = self.client.get(reverse('profile-list'))
+            self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+            staff = User.objects.create_superuser(
+                username='staff', email='staff@example.com', password='testpass123'
+            )
+            self.client.force_login(staff)
+            response = self.client.get(reverse('profile-list'))
+            self.assertContains(response, name)
+            response = self.client.get(detail_url + '?raw=1')
+            self.assertEqual(response['Content-Type'], 'text/plain')
+            response = self.client.get(reverse('profile-detail', args=['settings.py']))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CompressedTextFieldTestCase(TestCase):
+    """Test suite for compressed storage of note bodies"""
+
+    def stored_body(self, note):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT body FROM api_note WHERE id = %s', [note.pk])
+            return cursor.fetchone()[0]
+
+    def test_small_body_is_stored_plain(self):
+        """Test that bodies below the threshold are stored unchanged"""
+        note = Note.objects.create(body="Short note")
+        self.assertEqual(self.stored_body(note), "Short note")
+
+    def test_large_body_is_compressed(self):
+        """Test that large bodies are compressed and read back transparently"""
+        body = "Repeated meeting notes. " * 500
+        note = Note.objects.create(body=body)
+        stored = self.stored_body(note)
+        self.assertTrue(stored.startswith(COMPRESSED_MARKER))
+        self.assertLess(len(stored), len(body) / 4)
+        self.assertEqual(Note.objects.get(pk=note.pk).body, body)
+        self.assertEqual(NoteSerializer(Note.objects.get(pk=note.pk)).data['body'], body)
+
+    def test_legacy_and_marker_values(self):
+        """Test that plain rows read back as-is and marker-prefixed text round trips"""
+        self.assertEqual(decompress_text("written before compression"), "written before compression")
+        body = COMPRESSED_MARKER + "not compressed"
+        self.assertEqual(decompress_text(compress_text(body)), body)
+        note = Note.objects.create(body=body)
+        self.assertEqual(Note.objects.get(pk=note.pk).body, body)
+
+    def test_admin_search_finds_compressed_body(self):
+        """Test that admin search still matches compressed bodies"""
+        superuser = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='testpass123'
+        )
+        note = Note.objects.create(body="filler text " * 200 + "needle")
+        self.client.force_login(superuser)
+        response = self.client.get(reverse('admin:api_note_changelist') + '?q=needle')
+        # The changelist only shows the start of the body.
+        self.assertContains(response, reverse('admin:api_note_change', args=[note.pk]))
+
+
+class CompressionMiddlewareTestCase(TestCase):
+    """Test suite for response compression"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            Note.objects.create(body=f"Compressible note number {i} " * 5)
+        cls.list_url = reverse('note-list-create')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_gzip_is_negotiated(self):
+        """Test that gzip is used when the client accepts it"""
+        response = self.client.get(self.list_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(data['status'], 'success')
+
+    @skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_is_preferred(self):
+        """Test that brotli is preferred over gzip"""
+        response = self.client.get(self.list_url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(brotli.decompress(response.content))['status'], 'success')
+
+    def test_uncompressed_without_accept_encoding(self):
+        """Test that responses are left alone for clients without support"""
+        response = self.client.get(self.list_url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_compressed_variant_is_cached(self):
+        """Test that the same payload is compressed only once"""
+        with patch('api.compression.compress', wraps=compression.compress) as compress:
+            first = self.client.get(self.list_url, HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get(self.list_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+    def test_only_cache_served_responses_are_stored(self):
+        """Test that responses not served from a cache are compressed but not kept"""
+        # Archived notes are listed straight from the database.
+        response = self.client.get(self.list_url + '?include_archived=1', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse([key for key in cache._cache if 'compressed_' in key])
+        self.client.get(self.list_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue([key for key in cache._cache if 'compressed_' in key])
+
+    def test_html_gets_padded_gzip(self):
+        """Test that HTML is never brotli-compressed and gzip output is padded"""
+        self.client.force_login(User.objects.create_superuser(username='admin', email='admin@example.com'))
+        url = reverse('admin:api_note_changelist')
+        first = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        with patch('api.compression.compress_string', wraps=compression.compress_string) as compress_string:
+            self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compress_string.call_args.kwargs['max_random_bytes'], compression.GZIP_MAX_RANDOM_BYTES)
+
+
+class NoteRevisionTestCase(APITestCase):
+    """Test suite for note revision history"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='writer', email='writer@example.com', password='testpass123'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def test_delta_round_trip(self):
+        """Test that applying a delta reproduces the new text"""
+        old = "first line\nsecond line\nthird line\n"
+        new = "first line\nchanged line\nthird line\nfourth line"
+        self.assertEqual(apply_delta(old, make_delta(old, new)), new)
+        self.assertEqual(apply_delta(new, make_delta(new, '')), '')
+
+    def test_saves_are_recorded_as_deltas(self):
+        """Test that each save adds a revision and only the first is a snapshot"""
+        body = "\n".join(f"line {i}" for i in range(100))
+        note = Note.objects.create(body=body)
+        run_pending()
+        note.body = body + "\nappended"
+        note.save()
+        run_pending()
+        note.save()  # unchanged body, still a new version
+        run_pending()
+
+        revisions = list(note.revisions.all())
+        self.assertEqual([r.version for r in revisions], [1, 2, 3])
+        self.assertEqual(note.version, 3)
+        self.assertTrue(revisions[0].is_snapshot)
+        self.assertFalse(revisions[1].is_snapshot)
+        self.assertLess(len(revisions[1].data), 50)
+        self.assertEqual(reconstruct(note.pk, 1), body)
+        self.assertEqual(reconstruct(note.pk, 2), body + "\nappended")
+        self.assertEqual(reconstruct(note.pk, 3), body + "\nappended")
+
+    def test_version_is_bumped_in_the_database(self):
+        """Test that saving a stale instance doesn't reuse a version"""
+        note = Note.objects.create(body="original")
+        stale = Note.objects.get(pk=note.pk)
+        note.body = "first edit"
+        note.save()
+        stale.body = "second edit"
+        stale.save()
+        run_pending()
+
+        self.assertEqual((note.version, stale.version), (2, 3))
+        self.assertEqual(Note.objects.get(pk=note.pk).version, 3)
+        self.assertEqual(list(note.revisions.values_list('version', flat=True)), [1, 2, 3])
+        self.assertEqual(reconstruct(note.pk, 3), "second edit")
+
+    @override_settings(NOTE_REVISION_SNAPSHOT_INTERVAL=3)
+    def test_periodic_snapshots(self):
+        """Test that a snapshot is stored every NOTE_REVISION_SNAPSHOT_INTERVAL versions"""
+        header = "shared header line\n" * 10
+        note = Note.objects.create(body=header + "v1")
+        run_pending()
+        for i in range(2, 8):
+            note.body = header + f"v{i}"
+            note.save()
+            run_pending()
+        snapshots = note.revisions.filter(is_snapshot=True).values_list('version', flat=True)
+        self.assertEqual(list(snapshots), [1, 4, 7])
+        for i in range(1, 8):
+            self.assertEqual(reconstruct(note.pk, i), header + f"v{i}")
+
+    def test_history_endpoints(self):
+        """Test listing history and fetching an old version"""
+        note = Note.objects.create(body="original")
+        run_pending()
+        self.client.put(
+            reverse('note-retrieve-update-destroy', kwargs={'pk': note.pk}),
+            data=json.dumps({'body': 'edited'}),
+            content_type='application/json'
+        )
+        run_pending()
+        response = self.client.get(reverse('note-history', kwargs={'pk': note.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['version'] for r in response.data['results']], [2, 1])
+
+        response = self.client.get(reverse('note-revision-detail', kwargs={'pk': note.pk, 'version': 1}))
+        self.assertEqual(response.data['data']['body'], 'original')
+
+        response = self.client.get(reverse('note-revision-detail', kwargs={'pk': note.pk, 'version': 9}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(reverse('note-history', kwargs={'pk': 9999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_revert(self):
+        """Test reverting to an old version records a new revision"""
+        note = Note.objects.create(body="original")
+        run_pending()
+        note.body = "edited"
+        note.save()
+        run_pending()
+
+        response = self.client.post(
+            reverse('note-revert', kwargs={'pk': note.pk}),
+            data=json.dumps({'version': 1}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['body'], 'original')
+        run_pending()
+        note.refresh_from_db()
+        self.assertEqual(note.body, 'original')
+        self.assertEqual(note.revisions.count(), 3)
+
+
+@task('tests.collect', batch=True)
+def collect_payloads(payloads):
+    TaskQueueTestCase.batches.append(sorted(p['value'] for p in payloads))
+
+
+@task('tests.flaky')
+def flaky_task(value):
+    raise RuntimeError(value)
+
+
+class TaskQueueTestCase(TestCase):
+    """Test suite for the background task queue"""
+
+    batches = []
+
+    def setUp(self):
+        TaskQueueTestCase.batches = []
+        Task.objects.all().delete()
+
+    def test_tasks_run_after_commit(self):
+        """Test that enqueued tasks wake the workers only on commit"""
+        with patch('api.tasks.wake_workers') as wake_workers:
+            with self.captureOnCommitCallbacks(execute=True):
+                enqueue('tests.collect', value=1)
+                self.assertFalse(wake_workers.called)
+            self.assertTrue(wake_workers.called)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_similar_tasks_are_batched(self):
+        """Test that a batch handler gets each distinct payload once"""
+        for value in (1, 2, 1, 3):
+            enqueue('tests.collect', value=value)
+        self.assertEqual(run_pending(), 4)
+        self.assertEqual(self.batches, [[1, 2, 3]])
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(TASK_QUEUE={'MAX_ATTEMPTS': 2, 'RETRY_DELAY': 0})
+    def test_failed_tasks_are_retried(self):
+        """Test that failures are retried with backoff, then marked failed"""
+        enqueue('tests.flaky', value='boom')
+        run_pending()
+        failed = Task.objects.get()
+        self.assertEqual((failed.status, failed.attempts), (Task.PENDING, 1))
+        self.assertIn('boom', failed.last_error)
+
+        run_pending()
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), (Task.FAILED, 2))
+        self.assertEqual(run_pending(), 0)
+
+    def test_note_save_defers_revision(self):
+        """Test that saves between queue runs each keep their revision"""
+        note = Note.objects.create(body="first")
+        note.body = "second"
+        note.save()
+        note.body = "third"
+        note.save()
+        self.assertFalse(note.revisions.exists())
+        note.body = "current"
+        Note.objects.filter(pk=note.pk).update(body="current")
+        run_pending()
+        self.assertEqual(
+            [reconstruct(note.pk, r.version) for r in note.revisions.order_by('version')],
+            ["first", "second", "third"],
+        )
+
+    def test_revisions_recorded_out_of_order(self):
+        """Test that a version recorded before its predecessor is a snapshot"""
+        bodies = {version: "shared line\n" * 10 + f"v{version}\n" for version in (1, 2, 3)}
+        note = Note.objects.create(body=bodies[1])
+        for version in (1, 3, 2):
+            record_revision(note.pk, version, bodies[version])
+        self.assertIsNone(record_revision(note.pk, 2, "ignored"))
+        revisions = note.revisions.order_by('version')
+        self.assertEqual([r.is_snapshot for r in revisions], [True, False, True])
+        for version, body in bodies.items():
+            self.assertEqual(reconstruct(note.pk, version), body)
+
+    def test_deleted_note_revisions_are_dropped(self):
+        """Test that a note deleted before its task runs gets no history"""
+        note = Note.objects.create(body="short-lived")
+        pk = note.pk
+        note.delete()
+        run_pending()
+        self.assertFalse(NoteRevision.objects.filter(note_id=pk).exists())
+
+
+class WarmCachesTestCase(TestCase):
+    """Test suite for warming a new server worker"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for i in range(3):
+            Note.objects.create(body=f'Warm {i}')
+
+    def test_small_table_fills_the_list_cache(self):
+        """Test that the note list is cached while the table is small"""
+        warm_caches()
+        self.assertEqual(len(cache.get('notes_all')), 3)
+
+    def test_large_table_is_not_loaded(self):
+        """Test that a large table isn't loaded into every worker"""
+        with patch('api.views.WARM_CACHE_LIMIT', 2), self.assertNumQueries(1):
+            warm_caches()
+        self.assertIsNone(cache.get('notes_all'))
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379',
+    }})
+    def test_shared_cache_is_not_filled(self):
+        """Test that workers don't all rebuild the list in a shared cache"""
+        with self.assertNumQueries(0):
+            warm_caches()
+
+
+class ColdStartTestCase(SimpleTestCase):
+    """
+    Regression tests for server worker startup. Timings are left to
+    `manage.py import_report`; a wall-clock budget here would be flaky.
+    """
+
+    def start_worker(self):
+        """Modules imported by django.setup() and URL resolution in a fresh process."""
+        script = (
+            'import sys\n'
+            'import config.wsgi\n'
+            'from django.urls import get_resolver\n'
+            'get_resolver().url_patterns\n'
+            'print(" ".join(sys.modules))\n'
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='config.settings')
+        result = subprocess.run(
+            [sys.executable, '-c', script], capture_output=True, text=True,
+            env=env, cwd=settings.BASE_DIR, check=True,
+        )
+        return set(result.stdout.split())
+
+    def test_docs_and_auth_stacks_are_not_imported(self):
+        """Test that drf_yasg, social auth and Google auth load lazily"""
+        modules = self.start_worker()
+        loaded = {
+            module for module in modules
+            if module.split('.')[0] in ('drf_yasg', 'rest_framework_simplejwt', 'social_django',
+                                        'social_core', 'google')
+        }
+        # The drf_yasg app package itself is imported by django.setup().
+        self.assertEqual(loaded, {'drf_yasg'})
+
+    def test_lazy_routes_still_resolve(self):
+        """Test that lazily included URLconfs reverse and resolve"""
+        self.assertEqual(reverse('authentication:user-detail'), '/api/auth/me/')
+        self.assertEqual(reverse('schema-swagger-ui'), '/swagger/')
+
+
+class CachedSchemaTestCase(TestCase):
+
+    def setUp(self):
+        from config import docs
+        self.docs = docs
+        docs._documents.clear()
+        self.addCleanup(docs._documents.clear)
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.artifact = os.path.join(self.tmpdir, 'openapi-schema.json')
+        override = override_settings(OPENAPI_SCHEMA_FILE=self.artifact)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_schema_is_generated_once(self):
+        """Test that the schema is built on the first request only"""
+        with patch.object(self.docs, 'build_documents', wraps=self.docs.build_documents) as build:
+            first = self.client.get('/swagger.json/')
+            second = self.client.get('/swagger.json/')
+            ui_schema = self.client.get('/swagger/', {'format': 'openapi'})
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.content, ui_schema.content)
+        self.assertIn('/notes/', json.loads(first.content)['paths'])
+
+    def test_etag_revalidation(self):
+        """Test that a matching If-None-Match gets a 304"""
+        response = self.client.get('/swagger.yaml/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('application/yaml'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        response = self.client.get('/swagger.yaml/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_artifact_is_served_without_generating(self):
+        """Test that generate_schema output is used while the URLconf matches"""
+        call_command('generate_schema', output=self.artifact, stdout=StringIO())
+        with patch.object(self.docs, 'build_documents') as build:
+            response = self.client.get('/swagger.json/')
+        build.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+
+    def test_urlconf_change_regenerates(self):
+        """Test that a stale artifact or cached schema is not served"""
+        call_command('generate_schema', output=self.artifact, stdout=StringIO())
+        self.client.get('/swagger.json/')
+        with patch.object(self.docs, 'urlconf_fingerprint', return_value='changed'), \
+                patch.object(self.docs, 'build_documents', wraps=self.docs.build_documents) as build:
+            self.client.get('/swagger.json/')
+        build.assert_called_once_with('changed')
+
+    def test_code_change_changes_fingerprint(self):
+        """Test that the fingerprint covers the view and serializer sources"""
+        with patch.object(self.docs, 'source_digest', return_value='old') as digest:
+            old = self.docs.urlconf_fingerprint()
+        modules = digest.call_args.args[0]
+        self.assertIn('api.views', modules)
+        self.assertIn('api.serializers', modules)
+        with patch.object(self.docs, 'source_digest', return_value='new'):
+            self.assertNotEqual(self.docs.urlconf_fingerprint(), old)
+
+    def test_unknown_format(self):
+        """Test that only JSON and YAML are served"""
+        self.assertEqual(self.client.get('/swagger.xml/').status_code, 404)
+
+
+class SlidingWindowThrottleTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        rates = patch.object(SlidingWindowThrottle, 'THROTTLE_RATES', {
+            'notes_read': '3/min',
+            'notes_write': '2/min',
+        })
+        rates.start()
+        self.addCleanup(rates.stop)
+        self.now = 600.0
+        timer = patch.object(SlidingWindowThrottle, 'timer', lambda _: self.now)
+        timer.start()
+        self.addCleanup(timer.stop)
+        self.user = get_user_model().objects.create_user(username='throttled', password='pass')
+        self.client.force_authenticate(self.user)
+        self.note = Note.objects.create(body='Throttled note')
+
+    def test_read_limit(self):
+        """Test that reads over the rate get a 429 with Retry-After"""
+        for _ in range(3):
+            self.assertEqual(self.client.get('/notes/').status_code, 200)
+        response = self.client.get(f'/notes/{self.note.pk}/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_read_and_write_rates_are_separate(self):
+        """Test that exhausting reads leaves writes available"""
+        for _ in range(3):
+            self.client.get('/notes/')
+        self.assertEqual(self.client.get('/notes/').status_code, 429)
+        self.assertEqual(self.client.post('/notes/', {'body': 'one'}).status_code, 201)
+        self.assertEqual(self.client.post('/notes/', {'body': 'two'}).status_code, 201)
+        self.assertEqual(self.client.post('/notes/', {'body': 'three'}).status_code, 429)
+
+    def test_window_slides(self):
+        """Test that the previous window's count fades out over time"""
+        for _ in range(3):
+            self.client.get('/notes/')
+        # Next window, a third in: 3 * 2/3 = 2 requests still count.
+        self.now += 80
+        self.assertEqual(self.client.get('/notes/').status_code, 200)
+        self.assertEqual(self.client.get('/notes/').status_code, 429)
+        # Two thirds in: 3 * 1/3 + 1 = 2.
+        self.now += 20
+        self.assertEqual(self.client.get('/notes/').status_code, 200)
+        self.assertEqual(self.client.get('/notes/').status_code, 429)
+
+    def test_rejected_requests_are_not_counted(self):
+        """Test that hammering while throttled doesn't extend the block"""
+        for _ in range(10):
+            self.client.get('/notes/')
+        self.assertEqual(cache.get(f'throttle_notes_read_{self.user.pk}_10'), 3)
+        self.now += 120
+        self.assertEqual(self.client.get('/notes/').status_code, 200)
+
+    def test_counter_evicted_before_decrement(self):
+        """Test that a counter gone from the cache still gets a 429, not an error"""
+        for _ in range(3):
+            self.client.get('/notes/')
+        with patch.object(SlidingWindowThrottle, 'cache') as throttle_cache:
+            throttle_cache.get.return_value = 0
+            throttle_cache.incr.return_value = 4
+            throttle_cache.decr.side_effect = ValueError('evicted')
+            self.assertEqual(self.client.get('/notes/').status_code, 429)
+
+    def test_wait_without_counts(self):
+        """Test that a zero rate or emptied counters suggest a full window, not an error"""
+        with patch.object(SlidingWindowThrottle, 'THROTTLE_RATES', {'notes_read': '0/min'}):
+            response = self.client.get('/notes/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+        throttle = SlidingWindowThrottle()
+        throttle.duration, throttle.num_requests, throttle.weight = 60, 3, 0.5
+        throttle.current, throttle.previous = 1, 0
+        self.assertEqual(throttle.wait(), 60)
+
+    def test_clients_are_limited_separately(self):
+        """Test that each user has their own counter"""
+        for _ in range(3):
+            self.client.get('/notes/')
+        other = get_user_model().objects.create_user(username='other', password='pass')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/notes/').status_code, 200)
+
+    def test_wait(self):
+        """Test the suggested wait for a full window"""
+        for _ in range(3):
+            self.client.get('/notes/')
+        response = self.client.get('/notes/')
+        # Window ends in 60s; then 3 * (1 - t/60) + 1 <= 3 needs t >= 20.
+        self.assertEqual(response['Retry-After'], '80')
+
+
+class UserCacheTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        User = get_user_model()
+        self.user = User.objects.create_user(username='me', email='me@example.com', password='pass',
+                                             first_name='Ada')
+        self.others = [
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com')
+            for i in range(3)
+        ]
+        self.client.force_authenticate(self.user)
+
+    def test_me_is_cached(self):
+        """Test that /api/auth/me/ serializes the user once"""
+        response = self.client.get('/api/auth/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], 'Ada')
+        self.assertEqual(response.data['auth_provider'], 'email')
+        with patch('authentication.cache.UserSerializer') as serializer:
+            self.assertEqual(self.client.get('/api/auth/me/').data, response.data)
+        serializer.assert_not_called()
+
+    def test_me_is_invalidated_on_save(self):
+        """Test that saving the user drops the cached profile"""
+        self.client.get('/api/auth/me/')
+        self.user.first_name = 'Grace'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/me/').data['first_name'], 'Grace')
+
+    def test_login_keeps_the_cache(self):
+        """Test that last_login updates don't invalidate"""
+        self.client.get('/api/auth/me/')
+        self.user.save(update_fields=['last_login'])
+        self.assertIsNotNone(cache.get(f'user_{self.user.pk}'))
+
+    def test_batched_users(self):
+        """Test that ids resolve in order with one query, then from cache"""
+        ids = [self.others[2].pk, self.others[0].pk, 999999, self.others[2].pk]
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/users/', {'ids': ','.join(map(str, ids))})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['id'] for user in response.data], [self.others[2].pk, self.others[0].pk])
+        self.assertEqual(set(response.data[0]), {'id', 'first_name', 'last_name'})
+
+        ids.append(self.others[1].pk)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/users/', {'ids': ','.join(map(str, ids))})
+        self.assertEqual(len(response.data), 3)
+        with self.assertNumQueries(0):
+            self.client.get('/api/auth/users/', {'ids': ','.join(map(str, ids))})
+
+    def test_unknown_user_cache_is_invalidated_on_create(self):
+        """Test that a cached unknown id resolves once the user exists"""
+        next_pk = self.others[-1].pk + 1
+        self.assertEqual(self.client.get('/api/auth/users/', {'ids': next_pk}).data, [])
+        get_user_model().objects.create_user(username='new', email='new@example.com')
+        response = self.client.get('/api/auth/users/', {'ids': next_pk})
+        self.assertEqual([user['id'] for user in response.data], [next_pk])
+
+    def test_batched_users_validation(self):
+        """Test that bad or missing ids are rejected"""
+        for params in ({}, {'ids': 'a,b'}, {'ids': ','}, {'ids': ','.join(map(str, range(101)))},
+                       {'ids': '99999999999999999999'}, {'ids': '1,0'}, {'ids': '-5'}):
+            self.assertEqual(self.client.get('/api/auth/users/', params).status_code, 400)
+
+    def test_batched_users_requires_login(self):
+        """Test that anonymous clients can't list users"""
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/auth/users/', {'ids': '1'}).status_code, 403)
+
+
+class TrigramIndexTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.notes = {
+            'meeting': self.create_note('Weekly meeting notes: budget review and hiring plan'),
+            'meeting_copy': self.create_note('Weekly meeting notes: budget review and the hiring plan'),
+            'groceries': self.create_note('Groceries: apples, oat milk, coffee beans, bread'),
+            'trip': self.create_note('Trip itinerary for Lisbon with museum tickets'),
+        }
+
+    def create_note(self, body):
+        note = Note.objects.create(body=body)
+        run_pending()
+        return note
+
+    def test_extract_trigrams(self):
+        """Test that words are lowercased and padded like pg_trgm"""
+        self.assertEqual(extract_trigrams('Cat'), {'  c', ' ca', 'cat', 'at '})
+        self.assertEqual(extract_trigrams('a, b!'), {'  a', ' a ', '  b', ' b '})
+        self.assertEqual(extract_trigrams(''), set())
+
+    def test_index_follows_saves(self):
+        """Test that edits and deletes keep rows and frequencies in sync"""
+        note = self.notes['trip']
+        self.assertEqual(IndexedNote.objects.get(note=note).trigram_count,
+                         len(extract_trigrams(note.body)))
+        self.assertEqual(Trigram.objects.get(trigram='lis').note_count, 1)
+
+        note.body = 'Trip itinerary for Porto'
+        note.save()
+        run_pending()
+        self.assertEqual(set(note.trigrams.values_list('trigram', flat=True)), extract_trigrams(note.body))
+        self.assertEqual(Trigram.objects.get(trigram='lis').note_count, 0)
+        self.assertEqual(Trigram.objects.get(trigram='por').note_count, 1)
+
+        note.delete()
+        self.assertEqual(Trigram.objects.get(trigram='por').note_count, 0)
+        self.assertFalse(NoteTrigram.objects.filter(note_id=self.notes['trip'].pk).exists())
+
+    def test_search_tolerates_typos(self):
+        """Test that a misspelled query finds the note"""
+        matches = trigrams.search('budgte reveiw')
+        self.assertEqual({note_id for note_id, _ in matches},
+                         {self.notes['meeting'].pk, self.notes['meeting_copy'].pk})
+        self.assertEqual(trigrams.search('zzzz qqqq'), [])
+
+    def test_search_matches_a_full_scan(self):
+        """Test that prefix filtering misses no note above the threshold"""
+        for query in ('meeting plan', 'coffee', 'museum tickts', 'notes on bread'):
+            query_trigrams = extract_trigrams(query)
+            expected = {
+                note.pk for note in Note.objects.all()
+                if len(query_trigrams & extract_trigrams(note.body)) >= 0.5 * len(query_trigrams)
+            }
+            found = {note_id for note_id, _ in trigrams.search(query, threshold=0.5, limit=100)}
+            self.assertEqual(found, expected, query)
+
+    def test_similar(self):
+        """Test that near-duplicates are found through the LSH buckets"""
+        matches = trigrams.similar(self.notes['meeting'].pk)
+        self.assertEqual([note_id for note_id, _ in matches], [self.notes['meeting_copy'].pk])
+        self.assertGreater(matches[0][1], 0.8)
+        self.assertEqual(trigrams.similar(self.notes['groceries'].pk), [])
+
+    def test_similar_to_archived_note(self):
+        """Test that an archived note, which isn't indexed, is compared by its body"""
+        meeting = self.notes['meeting']
+        Note.objects.filter(pk=meeting.pk).update(updated=timezone.now() - timedelta(days=400))
+        archive_notes(timedelta(days=90))
+        self.assertFalse(IndexedNote.objects.filter(note_id=meeting.pk).exists())
+
+        response = self.client.get(f'/notes/{meeting.pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([match['id'] for match in response.data['results']], [self.notes['meeting_copy'].pk])
+        # Bodies with more trigrams than fit in one query.
+        copy = self.notes['meeting_copy']
+        long_body = meeting.body + ' ' + ' '.join(f'word{i}' for i in range(400))
+        body_trigrams, copy_trigrams = extract_trigrams(long_body), extract_trigrams(copy.body)
+        with patch.object(trigrams, 'similar_candidates', return_value=[copy.pk]):
+            matches = trigrams.similar(meeting.pk, threshold=0.01, body=long_body)
+        self.assertEqual(matches, [(copy.pk, len(body_trigrams & copy_trigrams) / len(body_trigrams | copy_trigrams))])
+
+    def test_minhash_buckets_are_stable(self):
+        """Test that buckets only depend on the trigrams"""
+        first = trigrams.minhash_buckets(extract_trigrams('some text here'), 4, 3)
+        self.assertEqual(first, trigrams.minhash_buckets(extract_trigrams('here some text'), 4, 3))
+        self.assertEqual(len(first), 4)
+
+    def test_search_endpoint(self):
+        """Test the /notes/search/ envelope and validation"""
+        response = self.client.get('/notes/search/', {'q': 'grocerys coffee'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'success')
+        self.assertEqual(response.data['results'][0]['id'], self.notes['groceries'].pk)
+        self.assertIn('similarity', response.data['results'][0])
+        self.assertEqual(self.client.get('/notes/search/').status_code, 400)
+
+    def test_similar_endpoint(self):
+        """Test /notes/<pk>/similar/"""
+        response = self.client.get(f"/notes/{self.notes['meeting_copy'].pk}/similar/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([note['id'] for note in response.data['results']], [self.notes['meeting'].pk])
+        self.assertEqual(self.client.get('/notes/999999/similar/').status_code, 404)
+
+    def test_build_command(self):
+        """Test that build_trigram_index indexes notes saved without signals"""
+        note = Note.objects.bulk_create([Note(body='Unindexed note about gardening')])[0]
+        call_command('build_trigram_index', stdout=StringIO())
+        self.assertTrue(IndexedNote.objects.filter(note=note).exists())
+        self.assertEqual(trigrams.search('gardenin')[0][0], note.pk)
+
+
+class NoteArchiveTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(username='archivist', password='pass')
+        self.client.force_authenticate(self.user)
+        self.old = self.create_note('An old note about the 2019 offsite. ' * 5, days_ago=400)
+        self.old.body += 'Edited later.'
+        self.old.save()
+        run_pending()
+        Note.objects.filter(pk=self.old.pk).update(updated=timezone.now() - timedelta(days=400))
+        self.old.refresh_from_db()
+        self.recent = self.create_note('A recent note', days_ago=1)
+
+    def create_note(self, body, days_ago):
+        note = Note.objects.create(body=body)
+        run_pending()
+        Note.objects.filter(pk=note.pk).update(updated=timezone.now() - timedelta(days=days_ago))
+        return Note.objects.get(pk=note.pk)
+
+    def archive(self):
+        call_command('archive_notes', older_than='90d', stdout=StringIO())
+
+    def test_archive_moves_old_notes(self):
+        """Test that only notes not updated recently are moved, with their data"""
+        self.archive()
+        self.assertFalse(Note.objects.filter(pk=self.old.pk).exists())
+        self.assertTrue(Note.objects.filter(pk=self.recent.pk).exists())
+        archived = ArchivedNote.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.body, self.old.body)
+        self.assertEqual(archived.updated, self.old.updated)
+        self.assertEqual(archived.created, self.old.created)
+        # History stays, the search index doesn't.
+        self.assertEqual(NoteRevision.objects.filter(note_id=self.old.pk).count(), 2)
+        self.assertFalse(NoteTrigram.objects.filter(note_id=self.old.pk).exists())
+
+    def test_older_than_parsing(self):
+        """Test the --older-than formats"""
+        from api.management.commands.archive_notes import parse_age
+        self.assertEqual(parse_age('90d'), timedelta(days=90))
+        self.assertEqual(parse_age('12w'), timedelta(weeks=12))
+        self.assertEqual(parse_age('36h'), timedelta(hours=36))
+        self.assertEqual(parse_age('30'), timedelta(days=30))
+
+    def test_retrieve_archived(self):
+        """Test that archived notes are read without being restored"""
+        self.archive()
+        response = self.client.get(f'/notes/{self.old.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['body'], self.old.body)
+        self.assertTrue(ArchivedNote.objects.filter(pk=self.old.pk).exists())
+        self.assertEqual(self.client.get(f'/notes/{self.old.pk}/history/').status_code, 200)
+        self.assertEqual(self.client.get(f'/notes/{self.old.pk}/history/1/').status_code, 200)
+
+    def test_edit_restores(self):
+        """Test that editing an archived note moves it back"""
+        self.archive()
+        response = self.client.put(f'/notes/{self.old.pk}/', {'body': 'Back in use'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ArchivedNote.objects.filter(pk=self.old.pk).exists())
+        note = Note.objects.get(pk=self.old.pk)
+        self.assertEqual(note.body, 'Back in use')
+        self.assertEqual(note.created, self.old.created)
+        run_pending()
+        self.assertEqual(NoteRevision.objects.filter(note_id=note.pk).count(), 3)
+        self.assertTrue(IndexedNote.objects.filter(note=note).exists())
+
+    def test_invalid_edit_stays_archived(self):
+        """Test that an edit failing validation doesn't restore the note"""
+        self.archive()
+        response = self.client.put(f'/notes/{self.old.pk}/', {'body': '   '})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(ArchivedNote.objects.filter(pk=self.old.pk).exists())
+        self.assertFalse(Note.objects.filter(pk=self.old.pk).exists())
+
+    def test_revert_restores(self):
+        """Test that reverting an archived note moves it back"""
+        self.archive()
+        response = self.client.post(f'/notes/{self.old.pk}/revert/', {'version': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Note.objects.get(pk=self.old.pk).body, 'An old note about the 2019 offsite. ' * 5)
+
+    def test_delete_archived(self):
+        """Test that deleting an archived note removes it and its history"""
+        self.archive()
+        self.assertEqual(self.client.delete(f'/notes/{self.old.pk}/').status_code, 204)
+        self.assertFalse(ArchivedNote.objects.filter(pk=self.old.pk).exists())
+        self.assertFalse(Note.objects.filter(pk=self.old.pk).exists())
+        self.assertFalse(NoteRevision.objects.filter(note_id=self.old.pk).exists())
+
+    def test_list_include_archived(self):
+        """Test that archived notes are only listed on request"""
+        self.archive()
+        response = self.client.get('/notes/')
+        self.assertEqual([note['id'] for note in response.data['results']['results']], [self.recent.pk])
+        response = self.client.get('/notes/', {'include_archived': 'true'})
+        results = response.data['results']['results']
+        self.assertEqual([note['id'] for note in results], [self.recent.pk, self.old.pk])
+        self.assertEqual(results[1]['body'], self.old.body)
+        self.assertIn('T', results[1]['updated'])
+        self.assertEqual(response.data['results']['count'], 2)
+
+    def test_missing_note(self):
+        """Test that unknown notes are still 404s"""
+        self.assertEqual(self.client.get('/notes/999999/').status_code, 404)
+        self.assertEqual(self.client.put('/notes/999999/', {'body': 'x'}).status_code, 404)
+
+
+class NoteSyncTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(username='syncer', password='pass')
+        self.client.force_authenticate(self.user)
+        self.note = Note.objects.create(body='Shared note')
+        self.other = Note.objects.create(body='Other note')
+
+    def sync(self, *operations):
+        return self.client.post('/notes/sync/', {'operations': list(operations)}, format='json')
+
+    def test_version_counter(self):
+        """Test that every save bumps the version and clients can't set it"""
+        self.assertEqual(self.note.version, 1)
+        self.note.body = 'Edited'
+        self.note.save()
+        self.assertEqual(Note.objects.get(pk=self.note.pk).version, 2)
+        self.note.save(update_fields=['body'])
+        self.assertEqual(Note.objects.get(pk=self.note.pk).version, 3)
+        response = self.client.put(f'/notes/{self.note.pk}/', {'body': 'Via PUT', 'version': 99})
+        self.assertEqual(response.data['data']['version'], 4)
+
+    def test_batch_applies(self):
+        """Test that creates, updates and deletes apply in one request"""
+        response = self.sync(
+            {'op': 'create', 'client_id': 'tmp-1', 'body': 'Written offline'},
+            {'op': 'update', 'id': self.note.pk, 'base_version': 1, 'body': 'Edit 1'},
+            {'op': 'update', 'id': self.note.pk, 'base_version': 2, 'body': 'Edit 2'},
+            {'op': 'delete', 'id': self.other.pk, 'base_version': 1},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual(data['conflicts'], [])
+        self.assertEqual([result['version'] for result in data['applied']], [1, 2, 3, None])
+        created_id = data['applied'][0]['id']
+        self.assertEqual(data['applied'][0]['client_id'], 'tmp-1')
+        self.assertEqual(Note.objects.get(pk=created_id).body, 'Written offline')
+        self.assertEqual(Note.objects.get(pk=self.note.pk).body, 'Edit 2')
+        self.assertFalse(Note.objects.filter(pk=self.other.pk).exists())
+        self.assertEqual({note['id']: note['version'] for note in data['notes']},
+                         {created_id: 1, self.note.pk: 3})
+        self.assertEqual(data['deleted'], [self.other.pk])
+
+    def test_conflicts(self):
+        """Test that stale base versions are reported with the server copy"""
+        self.note.body = 'Changed on the server'
+        self.note.save()
+        deleted_pk = self.other.pk
+        self.other.delete()
+        response = self.sync(
+            {'op': 'update', 'id': self.note.pk, 'base_version': 1, 'body': 'Stale edit'},
+            {'op': 'update', 'id': deleted_pk, 'base_version': 1, 'body': 'Edit of a deleted note'},
+            {'op': 'delete', 'id': deleted_pk, 'base_version': 1},
+            {'op': 'create', 'body': 'Still applied'},
+        )
+        data = response.data['data']
+        self.assertEqual(
+            [(conflict['index'], conflict['reason'], conflict['version']) for conflict in data['conflicts']],
+            [(0, 'version', 2), (1, 'deleted', None)],
+        )
+        self.assertEqual([result['index'] for result in data['applied']], [2, 3])
+        self.assertEqual(Note.objects.get(pk=self.note.pk).body, 'Changed on the server')
+        server_copy = next(note for note in data['notes'] if note['id'] == self.note.pk)
+        self.assertEqual(server_copy['body'], 'Changed on the server')
+
+    def test_archived_notes(self):
+        """Test that syncing an archived note restores it"""
+        Note.objects.filter(pk=self.note.pk).update(updated=timezone.now() - timedelta(days=400))
+        call_command('archive_notes', older_than='90d', stdout=StringIO())
+        response = self.sync({'op': 'update', 'id': self.note.pk, 'base_version': 1, 'body': 'Back'})
+        self.assertEqual(response.data['data']['applied'][0]['version'], 2)
+        self.assertEqual(Note.objects.get(pk=self.note.pk).body, 'Back')
+
+    def test_validation(self):
+        """Test that malformed batches are rejected before anything applies"""
+        response = self.sync(
+            {'op': 'create', 'body': 'Not applied'},
+            {'op': 'update', 'id': self.note.pk, 'body': 'No base version'},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('base_version', str(response.data['errors']))
+        self.assertFalse(Note.objects.filter(body='Not applied').exists())
+        self.assertEqual(self.sync().status_code, 400)
+        self.assertEqual(self.sync({'op': 'create', 'body': '   '}).status_code, 400)
+
+    def test_out_of_range_ids(self):
+        """Test that ids and versions too large for the database are rejected, not a 500"""
+        huge = 99999999999999999999
+        response = self.sync(
+            {'op': 'delete', 'id': self.note.pk, 'base_version': 1},
+            {'op': 'delete', 'id': huge, 'base_version': 1},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id', str(response.data['errors']))
+        self.assertTrue(Note.objects.filter(pk=self.note.pk).exists())
+        response = self.sync({'op': 'update', 'id': self.note.pk, 'base_version': huge, 'body': 'x'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(f'/notes/{self.note.pk}/revert/', {'version': huge}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_login(self):
+        """Test that anonymous clients can't sync"""
+        self.client.force_authenticate(None)
+        self.assertEqual(self.sync({'op': 'create', 'body': 'x'}).status_code, 403)
+
+
+class NoteListSelectionTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.long = Note.objects.create(body='Großer Text ' + ''.join(f'{i:05d} ' for i in range(2000)))
+        self.short = Note.objects.create(body='Short note')
+
+    def list_notes(self, query):
+        response = self.client.get(f'/notes/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id']: item for item in response.data['results']['results']}
+
+    def test_decompress_prefix(self):
+        """Test that a cut stored value gives the start of the text"""
+        text = 'Grüße 😀 ' * 2000
+        stored = compress_text(text)
+        self.assertTrue(stored.startswith(COMPRESSED_MARKER))
+        for length in (1, 10, 300):
+            self.assertEqual(decompress_prefix(stored[:stored_prefix_length(length)], length), text[:length])
+        escaped = compress_text(COMPRESSED_MARKER + 'plain')
+        self.assertEqual(decompress_prefix(escaped, 3), COMPRESSED_MARKER + 'pl')
+
+    def test_fields(self):
+        """Test that ?fields= returns and loads only the chosen fields"""
+        with self.assertNumQueries(1) as queries:
+            notes = self.list_notes('fields=id,updated')
+        self.assertNotIn('body', queries.captured_queries[0]['sql'])
+        self.assertEqual(set(notes[self.long.pk]), {'id', 'updated'})
+        response = self.client.get('/notes/?fields=id,owner')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['status'], 'error')
+        self.assertIn('fields', response.data['errors'])
+
+    def test_preview(self):
+        """Test that ?preview= cuts bodies without loading them"""
+        with self.assertNumQueries(1) as queries:
+            notes = self.list_notes('fields=id,body&preview=20')
+        self.assertIn('SUBSTR("api_note"."body"', queries.captured_queries[0]['sql'])
+        self.assertEqual(notes[self.long.pk], {'id': self.long.pk, 'body': self.long.body[:20]})
+        self.assertEqual(notes[self.short.pk]['body'], 'Short note')
+        self.assertEqual(self.list_notes('preview=5')[self.long.pk]['version'], 1)
+
+    def test_preview_of_poorly_compressed_body(self):
+        """Test that a body whose prefix is too short to decompress is read again"""
+        rng = random.Random(0)
+        note = Note.objects.create(body=''.join(chr(rng.randrange(0x1F300, 0x1F600)) for _ in range(3000)))
+        self.assertTrue(compress_text(note.body).startswith(COMPRESSED_MARKER))
+        with self.assertNumQueries(2):
+            notes = self.list_notes('preview=300')
+        self.assertEqual(notes[note.pk]['body'], note.body[:300])
+        self.assertEqual(notes[self.long.pk]['body'], self.long.body[:300])
+
+    def test_selections_cached_separately(self):
+        """Test that each selection has its own cache entry, and saves drop all of them"""
+        self.list_notes('')
+        self.list_notes('preview=5')
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.list_notes('')[self.long.pk]['body']), len(self.long.body))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.list_notes('preview=5')[self.long.pk]['body'], 'Große')
+
+        self.short.body = 'Edited short note'
+        self.short.save()
+        self.assertEqual(self.list_notes('preview=6')[self.short.pk]['body'], 'Edited')
+        self.assertEqual(self.list_notes('')[self.short.pk]['body'], 'Edited short note')
+
+    def test_include_archived(self):
+        """Test that the selection also applies to archived notes"""
+        ArchivedNote.objects.create(
+            id=self.long.pk + 100, body=self.long.body, version=3,
+            updated=self.long.updated, created=self.long.created,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            notes = self.list_notes('include_archived=1&fields=id,body&preview=8')
+        self.assertEqual(notes[self.long.pk + 100]['body'], 'Großer T')
+        self.assertEqual(notes[self.short.pk]['body'], 'Short no')
+        self.assertEqual(set(notes[self.long.pk + 100]), {'id', 'body'})
+        # The union only lists ids; prefixes are read for the page's notes.
+        for query in queries.captured_queries:
+            if 'UNION' in query['sql']:
+                self.assertNotIn('body', query['sql'])
+            elif 'SUBSTR' in query['sql']:
+                self.assertIn(' IN (', query['sql'])
+
+    def test_include_archived_reads_previews_per_page(self):
+        """Test that only the listed page's bodies are read"""
+        for i in range(12):
+            Note.objects.create(body=f'Page filler {i:02d}')
+        with patch('api.views.read_previews', side_effect=read_previews) as previews:
+            response = self.client.get('/notes/?include_archived=1&preview=11')
+        self.assertEqual(response.data['results']['count'], 14)
+        page = response.data['results']['results']
+        self.assertEqual(len(page), 10)
+        self.assertEqual(len(previews.call_args.args[0]), 10)
+        self.assertEqual(page[0]['body'], 'Page filler')
+
+
+class NoteAdminChangelistTestCase(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', email='admin@example.com'))
+        self.long = Note.objects.create(body='Quarterly planning: ' + 'roadmap and budget review ' * 200)
+        self.short = Note.objects.create(body='Dentist appointment on Friday')
+        run_pending()
+        self.url = reverse('admin:api_note_changelist')
+
+    def test_body_preview(self):
+        """Test that rows show a preview read with Substr, not the whole body"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, self.long.body[:50] + '...')
+        self.assertContains(response, 'Dentist appointment on Friday')
+        selects = [query['sql'] for query in queries if 'FROM "api_note"' in query['sql']]
+        self.assertTrue(any('SUBSTR("api_note"."body"' in sql for sql in selects))
+        for sql in selects:
+            self.assertNotIn('"api_note"."body"', sql.replace('SUBSTR("api_note"."body"', ''))
+
+    def test_estimated_count(self):
+        """Test that large tables are estimated instead of counted"""
+        for i in range(4):
+            Note.objects.create(body=f'Filler {i}')
+        Note.objects.filter(body='Filler 1').delete()
+        with patch.object(EstimatedCountPaginator, 'EXACT_COUNT_LIMIT', 2):
+            # No statistics yet, so the count is cut off at the limit.
+            response = self.client.get(self.url)
+            self.assertEqual(response.context['cl'].result_count, 3)
+            self.assertContains(response, '2+ Notes')
+            response = self.client.get(self.url + '?q=Filler')
+            self.assertEqual(response.context['cl'].result_count, 3)
+
+            analyze(Note)
+            Note.objects.filter(body='Filler 2').delete()
+            response = self.client.get(self.url)
+            # As of the ANALYZE, so still counting the note deleted since.
+            self.assertEqual(response.context['cl'].result_count, 5)
+            self.assertContains(response, '5 Notes')
+            # Filtered lists are never estimated.
+            response = self.client.get(self.url + '?q=e')
+            self.assertEqual(response.context['cl'].result_count, 3)
+            self.assertContains(response, '2+ Notes')
+        self.assertEqual(self.client.get(self.url).context['cl'].result_count, 4)
+
+    def test_search_uses_trigram_index(self):
+        """Test that indexed notes are matched through the index and stale ones are scanned"""
+        self.assertTrue(compress_text(self.long.body).startswith(COMPRESSED_MARKER))
+        # Saved after indexing, so only a scan finds it.
+        stale = Note.objects.create(body='Budget meeting moved')
+        with patch.object(NoteAdmin, 'scan_search_results', autospec=True,
+                          side_effect=NoteAdmin.scan_search_results) as scan:
+            response = self.client.get(self.url + '?q=budget')
+        self.assertEqual(
+            {note.pk for note in response.context['cl'].result_list}, {self.long.pk, stale.pk}
+        )
+        scanned = scan.call_args.args[2]
+        self.assertEqual(list(scanned.values_list('pk', flat=True)), [stale.pk])
+
+        response = self.client.get(self.url + '?q=appoint+friday')
+        self.assertEqual([note.pk for note in response.context['cl'].result_list], [self.short.pk])
+        # Words straddling a trigram match are still checked against the body.
+        response = self.client.get(self.url + '?q=review+dentist')
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+    def test_date_hierarchy(self):
+        """Test that the changelist drills down by updated, with the same dates as a scan"""
+        for i, when in enumerate(['2023-12-31 23:30', '2024-02-29 12:00', '2024-03-01 00:00', '2024-03-01 08:00']):
+            note = Note.objects.create(body=f'Dated {i}')
+            Note.objects.filter(pk=note.pk).update(updated=datetime.fromisoformat(when + '+00:00'))
+        queryset = NoteAdmin(Note, admin.site).get_queryset(None)
+        for kind in ('year', 'month', 'day'):
+            self.assertEqual(queryset.datetimes('updated', kind), list(Note.objects.datetimes('updated', kind)))
+            self.assertEqual(
+                queryset.filter(updated__year=2024).datetimes('updated', kind, 'DESC'),
+                list(Note.objects.filter(updated__year=2024).datetimes('updated', kind, 'DESC')),
+            )
+        response = self.client.get(self.url + f'?updated__year={self.short.updated.year}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class IdempotencyKeyTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='retrier')
+        self.client.force_authenticate(self.user)
+
+    def post(self, body, key='key-1'):
+        return self.client.post('/notes/', {'body': body}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_response(self):
+        """Test that a retry gets the stored response without creating a note"""
+        response = self.post('Buy milk')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(0):
+            retry = self.post('Buy milk')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, response.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Note.objects.count(), 1)
+
+        self.assertEqual(self.post('Buy milk', key='key-2').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post('/notes/', {'body': 'Buy milk'}, format='json').status_code, 201)
+        self.assertEqual(Note.objects.count(), 3)
+
+    def test_keys_are_per_user(self):
+        """Test that another user's key doesn't replay"""
+        self.post('Mine')
+        self.client.force_authenticate(User.objects.create_user(username='other'))
+        response = self.post('Mine')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Note.objects.count(), 2)
+
+    def test_different_payload(self):
+        """Test that reusing a key for another payload is rejected"""
+        self.post('First')
+        response = self.post('Second')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.data['status'], 'error')
+        self.assertEqual(Note.objects.count(), 1)
+
+    def test_invalid_key(self):
+        """Test that an overlong key is rejected"""
+        response = self.post('Body', key='k' * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Note.objects.exists())
+
+    def test_errors_release_key(self):
+        """Test that a request that fails with an exception can be retried for real"""
+        with patch('api.views.NoteListCreateView.perform_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post('Body')
+        self.assertEqual(self.post('Body').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Note.objects.count(), 1)
+
+    def claim(self, body, key='key-1'):
+        """Mark `key` as taken by a request for `body` that is still running."""
+        request = APIRequestFactory().post('/notes/')
+        request.user = self.user
+        cache_key = idempotency_cache_key(request, key)
+        fingerprint = make_digest(json.dumps({'body': body}, sort_keys=True))
+        cache.set(cache_key, (idempotency.PENDING, fingerprint))
+        return cache_key, fingerprint
+
+    @override_settings(IDEMPOTENCY={'WAIT_TIMEOUT': 5, 'POLL_INTERVAL': 0.01})
+    def test_concurrent_retry_waits(self):
+        """Test that a retry of an in-flight request waits for its response"""
+        cache_key, fingerprint = self.claim('Body')
+        stored = {'status': 'success', 'data': {'id': 42, 'body': 'Body'}}
+
+        def finish():
+            time.sleep(0.1)
+            cache.set(cache_key, (idempotency.DONE, fingerprint, 201, stored))
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        response = self.post('Body')
+        thread.join()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, stored)
+        self.assertFalse(Note.objects.exists())
+
+    @override_settings(IDEMPOTENCY={'WAIT_TIMEOUT': 0.05, 'POLL_INTERVAL': 0.01})
+    def test_concurrent_retry_times_out(self):
+        """Test that a retry gives up with a 409 if the first request doesn't finish"""
+        self.claim('Body')
+        response = self.post('Body')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Note.objects.exists())
+
+    @override_settings(IDEMPOTENCY={'WAIT_TIMEOUT': 0.05, 'POLL_INTERVAL': 0.01})
+    def test_vanishing_entry_waits_and_times_out(self):
+        """Test that a key that can't be claimed but reads as missing is polled, not spun on"""
+        with patch.object(idempotency, 'cache') as key_cache, \
+                patch.object(idempotency.time, 'sleep', wraps=time.sleep) as sleep:
+            key_cache.add.return_value = False
+            key_cache.get.return_value = None
+            response = self.post('Body')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertTrue(sleep.called)
+        self.assertLess(key_cache.add.call_count, 20)
+        self.assertFalse(Note.objects.exists())
@@ -0,0 +1,68 @@
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import ScopedRateThrottle
+
+
+class SlidingWindowThrottle(ScopedRateThrottle):
+    """
+    Limits views with a `throttle_scope` to the '<scope>_read' rate for safe
+    methods and the '<scope>_write' rate for the others.
+
+    Uses a sliding window counter instead of DRF's per-request timestamp list:
+    each client has one counter per fixed window, and the request count over
+    the last `duration` seconds is estimated as the current window's count plus
+    the previous window's, weighted by how much of it still overlaps. Counters
+    are bumped with the cache's atomic incr, so with a shared cache the limits
+    hold across processes. Each check is a few cache calls on two integers.
+    """
+
+    def allow_request(self, request, view):
+        scope = getattr(view, self.scope_attr, None)
+        if not scope:
+            return True
+
+        self.scope = f"{scope}_{'read' if request.method in SAFE_METHODS else 'write'}"
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+
+        self.now = self.timer()
+        window, offset = divmod(self.now, self.duration)
+        self.weight = 1 - offset / self.duration
+        current_key = f'{self.key}_{int(window)}'
+        self.previous = self.cache.get(f'{self.key}_{int(window) - 1}', 0)
+
+        # Counters outlive their window by one so the next one can weigh them.
+        self.cache.add(current_key, 0, self.duration * 2)
+        try:
+            self.current = self.cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr().
+            self.cache.set(current_key, 1, self.duration * 2)
+            self.current = 1
+
+        if self.previous * self.weight + self.current > self.num_requests:
+            # Rejected requests don't count against the client.
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                # Evicted since incr(), so there is nothing to take back.
+                pass
+            self.current -= 1
+            return self.throttle_failure()
+        return True
+
+    def wait(self):
+        """Seconds until the estimate drops below the limit again."""
+        elapsed = (1 - self.weight) * self.duration
+        if self.current < self.num_requests:
+            if not self.previous:
+                # Only possible if the counters were evicted meanwhile.
+                return self.duration
+            # The previous window's share has to fade out enough.
+            needed = 1 - (self.num_requests - self.current - 1) / self.previous
+            return max(0, needed * self.duration - elapsed)
+        if not self.current:
+            # A rate of 0, or an evicted counter: no count to wait out.
+            return self.duration
+        # This window is full: wait for it to become the previous one and fade.
+        return self.duration - elapsed + (1 - (self.num_requests - 1) / self.current) * self.duration
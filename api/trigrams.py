@@ -0,0 +1,269 @@
+import hashlib
+import math
+import random
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import IndexedNote, Note, NoteBand, NoteTrigram, Trigram
+from .tasks import task
+
+WORD_RE = re.compile(r'\w+')
+
+# Keeps `__in` lookups well under SQLite's bound parameter limit.
+CHUNK_SIZE = 500
+
+# MinHash permutations are x -> (a * x + b) mod PRIME over 64-bit trigram hashes.
+PRIME = (1 << 61) - 1
+
+
+def get_trigram_settings():
+    options = {
+        'SEARCH_THRESHOLD': 0.5,
+        'SIMILAR_THRESHOLD': 0.5,
+        'SIMILAR_CANDIDATES': 100,
+        'MINHASH_BANDS': 20,
+        'MINHASH_ROWS': 5,
+    }
+    options.update(getattr(settings, 'TRIGRAM_INDEX', {}))
+    return options
+
+
+def extract_trigrams(text):
+    """
+    Distinct trigrams of the lowercased words in `text`, each word padded
+    with two spaces in front and one behind as PostgreSQL's pg_trgm does.
+    """
+    trigrams = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = f'  {word} '
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def stable_hash(value):
+    """64-bit hash that, unlike hash(), is the same in every process."""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+@lru_cache
+def get_permutations(count):
+    rng = random.Random(count)
+    return [(rng.randrange(1, PRIME), rng.randrange(PRIME)) for _ in range(count)]
+
+
+def minhash_buckets(trigrams, bands, rows):
+    """
+    LSH buckets of a trigram set: its MinHash signature cut into `bands`
+    bands of `rows` values, each band hashed with its position. Two sets with
+    Jaccard similarity s share a bucket with probability 1 - (1 - s**rows)**bands.
+    """
+    if not trigrams:
+        return []
+    hashes = [stable_hash(trigram) for trigram in trigrams]
+    signature = [min((a * x + b) % PRIME for x in hashes) for a, b in get_permutations(bands * rows)]
+    buckets = []
+    for band in range(bands):
+        values = ','.join(map(str, signature[band * rows:(band + 1) * rows]))
+        # Signed, to fit a BigIntegerField.
+        buckets.append(stable_hash(f'{band}:{values}') - (1 << 63))
+    return buckets
+
+
+def chunked(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@transaction.atomic
+def index_note(note):
+    """Bring the index rows of `note` in line with its current body."""
+    trigrams = extract_trigrams(note.body or '')
+    existing = set(NoteTrigram.objects.filter(note_id=note.pk).values_list('trigram', flat=True))
+    removed = existing - trigrams
+    added = trigrams - existing
+
+    for chunk in chunked(removed):
+        NoteTrigram.objects.filter(note_id=note.pk, trigram__in=chunk).delete()
+        Trigram.objects.filter(trigram__in=chunk).update(note_count=F('note_count') - 1)
+    if added:
+        NoteTrigram.objects.bulk_create(
+            [NoteTrigram(note_id=note.pk, trigram=trigram) for trigram in added],
+            batch_size=CHUNK_SIZE,
+        )
+        Trigram.objects.bulk_create(
+            [Trigram(trigram=trigram) for trigram in added],
+            batch_size=CHUNK_SIZE, ignore_conflicts=True,
+        )
+        for chunk in chunked(added):
+            Trigram.objects.filter(trigram__in=chunk).update(note_count=F('note_count') + 1)
+    if added or removed or not existing:
+        options = get_trigram_settings()
+        NoteBand.objects.filter(note_id=note.pk).delete()
+        NoteBand.objects.bulk_create([
+            NoteBand(note_id=note.pk, bucket=bucket)
+            for bucket in minhash_buckets(trigrams, options['MINHASH_BANDS'], options['MINHASH_ROWS'])
+        ])
+    IndexedNote.objects.update_or_create(note_id=note.pk, defaults={'trigram_count': len(trigrams)})
+
+
+def unindex_note(note_id):
+    """Drop `note_id` from the trigram frequencies; its rows go with the note."""
+    Trigram.objects.filter(
+        trigram__in=NoteTrigram.objects.filter(note_id=note_id).values('trigram')
+    ).update(note_count=F('note_count') - 1)
+
+
+@task('index_trigrams', batch=True)
+def index_trigrams(payloads):
+    """Deferred from Note saves."""
+    note_ids = {payload['note_id'] for payload in payloads}
+    for note in Note.objects.filter(pk__in=note_ids):
+        index_note(note)
+
+
+def get_frequencies(trigrams):
+    frequencies = {}
+    for chunk in chunked(trigrams):
+        frequencies.update(Trigram.objects.filter(trigram__in=chunk).values_list('trigram', 'note_count'))
+    return frequencies
+
+
+def count_shared(note_ids, trigrams):
+    """{note_id: how many of `trigrams` it contains} for the given notes."""
+    shared = {}
+    for notes in chunked(note_ids):
+        rows = (
+            NoteTrigram.objects
+            .filter(note_id__in=notes, trigram__in=trigrams)
+            .values('note_id')
+            .annotate(shared=Count('pk'))
+            .values_list('note_id', 'shared')
+        )
+        shared.update(rows)
+    return shared
+
+
+def search_probes(trigrams, required):
+    """The rarest len(trigrams) - required + 1 trigrams, minus those no note has."""
+    frequencies = get_frequencies(trigrams)
+    probes = sorted(trigrams, key=lambda trigram: frequencies.get(trigram, 0))
+    return [trigram for trigram in probes[:len(trigrams) - required + 1] if frequencies.get(trigram)]
+
+
+def search(query, threshold=None, limit=20):
+    """
+    Notes containing at least `threshold` of the query's trigrams, as
+    (note_id, similarity) pairs, best first. Tolerates typos: 'meetnig'
+    still shares most trigrams with 'meeting'.
+
+    A note with that many of the query's n trigrams must contain at least one
+    of any n - ceil(threshold * n) + 1 of them, so only the postings of the
+    rarest ones are read to find candidates. Those are then verified exactly.
+    """
+    if threshold is None:
+        threshold = get_trigram_settings()['SEARCH_THRESHOLD']
+    trigrams = extract_trigrams(query)
+    if not trigrams:
+        return []
+
+    required = math.ceil(threshold * len(trigrams))
+    probes = search_probes(trigrams, required)
+    candidates = set(NoteTrigram.objects.filter(trigram__in=probes).values_list('note_id', flat=True))
+
+    matches = [
+        (note_id, shared / len(trigrams))
+        for note_id, shared in count_shared(candidates, list(trigrams)).items()
+        if shared >= required
+    ]
+    matches.sort(key=lambda match: (-match[1], -match[0]))
+    return matches[:limit]
+
+
+def substring_candidates(text, limit=None):
+    """
+    Ids of indexed notes that may contain `text`, case-insensitively: those
+    with every trigram from inside its words. Only the postings of the
+    rarest one are read. None if `text` has no such trigram to look for, or
+    if even the rarest is in more than `limit` notes, making a scan cheaper.
+    """
+    trigrams = {
+        word[i:i + 3]
+        for word in WORD_RE.findall(text.lower())
+        for i in range(len(word) - 2)
+    }
+    if not trigrams:
+        return None
+    frequencies = get_frequencies(trigrams)
+    if len(frequencies) < len(trigrams) or not all(frequencies.values()):
+        return []
+    rarest = min(trigrams, key=frequencies.get)
+    if limit is not None and frequencies[rarest] > limit:
+        return None
+    candidates = NoteTrigram.objects.filter(trigram=rarest).values_list('note_id', flat=True)
+    return [
+        note_id for note_id, shared in count_shared(candidates, list(trigrams)).items()
+        if shared == len(trigrams)
+    ]
+
+
+def similar_candidates(note_id, buckets, limit):
+    """Notes other than `note_id` sharing the most of `buckets`."""
+    return list(
+        NoteBand.objects
+        .filter(bucket__in=buckets)
+        .exclude(note_id=note_id)
+        .values('note_id')
+        .annotate(hits=Count('pk'))
+        .order_by('-hits', '-note_id')
+        .values_list('note_id', flat=True)[:limit]
+    )
+
+
+def similar(note_id, threshold=None, limit=10, body=None):
+    """
+    Indexed notes most similar to `note_id` by trigram Jaccard similarity,
+    as (note_id, similarity) pairs, best first. A note that isn't indexed,
+    such as an archived one, is compared by its `body` instead.
+
+    Candidates come from the MinHash LSH buckets of the note (see
+    minhash_buckets()), so only notes likely to be similar are read, not
+    every note. With the default 20 bands of 5 rows a note at similarity 0.6
+    is found 80% of the time, one at 0.8 always, and an unrelated one at 0.1
+    0.02% of the time. The best SIMILAR_CANDIDATES are scored exactly.
+    """
+    options = get_trigram_settings()
+    if threshold is None:
+        threshold = options['SIMILAR_THRESHOLD']
+    if body is None:
+        try:
+            size = IndexedNote.objects.get(note_id=note_id).trigram_count
+        except IndexedNote.DoesNotExist:
+            return []
+        buckets = NoteBand.objects.filter(note_id=note_id).values('bucket')
+        # One subquery, however many trigrams the note has.
+        trigram_chunks = [NoteTrigram.objects.filter(note_id=note_id).values('trigram')]
+    else:
+        trigrams = extract_trigrams(body)
+        size = len(trigrams)
+        buckets = minhash_buckets(trigrams, options['MINHASH_BANDS'], options['MINHASH_ROWS'])
+        # Half chunks, leaving room for the candidate ids in each query.
+        trigram_chunks = chunked(trigrams, CHUNK_SIZE // 2)
+    candidates = similar_candidates(note_id, buckets, options['SIMILAR_CANDIDATES'])
+    sizes = dict(IndexedNote.objects.filter(note_id__in=candidates).values_list('note_id', 'trigram_count'))
+
+    counts = Counter()
+    for chunk in trigram_chunks:
+        counts.update(count_shared(candidates, chunk))
+    matches = []
+    for candidate, shared in counts.items():
+        score = shared / (size + sizes[candidate] - shared)
+        if score >= threshold:
+            matches.append((candidate, score))
+    matches.sort(key=lambda match: (-match[1], -match[0]))
+    return matches[:limit]
@@ -1,8 +1,23 @@
 # api/urls.py
 from django.urls import path 
-from .views import NoteListCreateView, NoteRetrieveUpdateDestroyView
+from .views import (
+    NoteHistoryView,
+    NoteListCreateView,
+    NoteRetrieveUpdateDestroyView,
+    NoteRevertView,
+    NoteRevisionDetailView,
+    NoteSearchView,
+    NoteSimilarView,
+    NoteSyncView,
+)
 
 urlpatterns = [
     path('notes/', NoteListCreateView.as_view(), name='note-list-create'),
+    path('notes/search/', NoteSearchView.as_view(), name='note-search'),
+    path('notes/sync/', NoteSyncView.as_view(), name='note-sync'),
     path('notes/<str:pk>/', NoteRetrieveUpdateDestroyView.as_view(), name='note-retrieve-update-destroy'),
+    path('notes/<int:pk>/history/', NoteHistoryView.as_view(), name='note-history'),
+    path('notes/<int:pk>/history/<int:version>/', NoteRevisionDetailView.as_view(), name='note-revision-detail'),
+    path('notes/<int:pk>/revert/', NoteRevertView.as_view(), name='note-revert'),
+    path('notes/<int:pk>/similar/', NoteSimilarView.as_view(), name='note-similar'),
 ]
\ No newline at end of file
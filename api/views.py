@@ -1,10 +1,63 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.exceptions import NotFound, ValidationError
-from .models import Note
-from .serializers import NoteSerializer
+from .archive import get_archived_note, note_exists, restore_note
+from .cache import NOTE_LIST_TIMEOUT, invalidate_note_lists, note_list_key
+from .compression import mark_cache_served
+from .fields import decompress_prefix, stored_prefix, stored_prefix_length
+from .idempotency import idempotent
+from .models import ArchivedNote, Note, NoteRevision
+from .serializers import (
+    NoteListSerializer,
+    NoteRevertSerializer,
+    NoteRevisionSerializer,
+    NoteSearchSerializer,
+    NoteSerializer,
+    NoteSimilarSerializer,
+    NoteSyncSerializer,
+)
+from .revisions import reconstruct
+from .sync import apply_operations
+from .trigrams import chunked, search, similar
 from django.utils.translation import gettext_lazy as _
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+# Past this many notes, warming a worker's list cache would load every body.
+WARM_CACHE_LIMIT = 1000
+
+
+def warm_caches():
+    """
+    Fill this process's note list cache, e.g. in a freshly forked server
+    worker. Skipped with a shared cache such as Redis, where every worker
+    would rebuild the same entry, and past WARM_CACHE_LIMIT notes.
+    """
+    if not isinstance(caches['default'], LocMemCache):
+        return
+    if Note.objects.order_by()[WARM_CACHE_LIMIT:].exists():
+        return
+    NoteListCreateView().get_queryset()
+
+
+def read_previews(prefixes, length, models=(Note,)):
+    """
+    {pk: preview} of `length` characters from {pk: stored body prefix}. The
+    rare bodies that compress too poorly for their prefix to reach that far
+    are read again from `models` with the worst-case prefix.
+    """
+    previews = {pk: decompress_prefix(prefix, length) for pk, prefix in prefixes.items()}
+    cut = stored_prefix_length(length)
+    short = [pk for pk, prefix in prefixes.items() if len(prefix) == cut and len(previews[pk]) < length]
+    for chunk in chunked(short):
+        for model in models:
+            rows = model.objects.filter(pk__in=chunk).order_by().values_list('pk', stored_prefix('body', length, worst_case=True))
+            previews.update((pk, decompress_prefix(prefix, length)) for pk, prefix in rows)
+    return previews
+
 
 class NoteListCreateView(generics.ListCreateAPIView):
 
@@ -12,28 +65,98 @@ class NoteListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     throttle_scope = 'notes'
 
+    def get_options(self):
+        """Validated NoteListSerializer options of this request."""
+        if not hasattr(self, '_options'):
+            request = getattr(self, 'request', None)
+            serializer = NoteListSerializer(data=request.query_params if request is not None else {})
+            serializer.is_valid(raise_exception=True)
+            self._options = serializer.validated_data
+        return self._options
+
+    def get_preview(self):
+        """Preview length, if bodies are listed and cut."""
+        options = self.get_options()
+        return options.get('preview') if 'body' in (options.get('fields') or ['body']) else None
+
     def get_queryset(self):
-        cache_key = 'notes_all'
+        options = self.get_options()
+        fields = options.get('fields')
+        preview = self.get_preview()
+
+        if options['include_archived']:
+            # Archived notes are rarely listed, so this isn't cached. The union
+            # is ordered by updated; previews are added by paginate_queryset().
+            columns = {'id', 'updated', *(fields or ['body', 'created', 'version'])}
+            if preview:
+                columns.discard('body')
+            querysets = [model.objects.order_by().values(*sorted(columns)) for model in (Note, ArchivedNote)]
+            return querysets[0].union(querysets[1], all=True).order_by('-updated')
+
+        selection = ','.join(fields) if fields else ''
+        if preview:
+            selection += f';{preview}'
+        cache_key = note_list_key(selection)
         queryset = cache.get(cache_key)
         if not queryset:
             queryset = Note.objects.all().order_by('-updated')
-            cache.set(cache_key, queryset, timeout=60*15)
+            if fields:
+                queryset = queryset.only(*fields)
+            if preview:
+                queryset = list(queryset.defer('body').annotate(body_prefix=stored_prefix('body', preview)))
+                previews = read_previews({note.pk: note.body_prefix for note in queryset}, preview)
+                for note in queryset:
+                    # The deferred field is set, never loaded.
+                    note.body = previews[note.pk]
+                    del note.body_prefix
+            cache.set(cache_key, queryset, timeout=NOTE_LIST_TIMEOUT)
         return queryset
 
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        preview = self.get_preview()
+        if page is not None and preview and self.get_options()['include_archived']:
+            # Only the bodies of this page are read, matched up by id.
+            ids = [row['id'] for row in page]
+            prefixes = {}
+            for model in (Note, ArchivedNote):
+                prefixes.update(
+                    model.objects.filter(pk__in=ids).order_by().values_list('pk', stored_prefix('body', preview))
+                )
+            previews = read_previews(prefixes, preview, models=(Note, ArchivedNote))
+            for row in page:
+                row['body'] = previews[row['id']]
+        return page
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', self.get_options().get('fields'))
+        return super().get_serializer(*args, **kwargs)
+
     def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
-        return Response({
+        try:
+            response = super().list(request, *args, **kwargs)
+        except ValidationError as e:
+            return Response({
+                'status': 'error',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        response = Response({
             'status': 'success',
             'count': len(response.data),
             'results': response.data
         })
+        if not self.get_options()['include_archived']:
+            mark_cache_served(response)
+        return response
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
             self.perform_create(serializer)
-            cache.delete('notes_all')
+            invalidate_note_lists()
             return Response({
                 'status': 'success',
                 'data': serializer.data
@@ -57,22 +180,49 @@ class NoteRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         pk = self.kwargs.get('pk')
         cache_key = f'note_{pk}'
         note = cache.get(cache_key)
+        self.cached_object = True
+        self.archived_object = False
         if not note:
             try:
                 note = Note.objects.get(pk=pk)
                 cache.set(cache_key, note, timeout=60*15)
             except Note.DoesNotExist:
-                raise NotFound(_('Note not found'))
+                note = self.get_archived_object(pk)
+                self.cached_object = False
+                self.archived_object = True
         return note
 
+    def get_archived_object(self, pk):
+        """
+        Archived notes are read in place. Writes move them back with
+        restore_archived_object() once they're about to be applied.
+        """
+        try:
+            return get_archived_note(pk)
+        except ArchivedNote.DoesNotExist:
+            raise NotFound(_('Note not found'))
+
+    def restore_archived_object(self, instance):
+        """`instance` itself, or the note restored from it if it's archived."""
+        if not self.archived_object:
+            return instance
+        try:
+            return restore_note(instance.pk)
+        except ArchivedNote.DoesNotExist:
+            # Restored or deleted by another request since it was read.
+            raise NotFound(_('Note not found'))
+
     def retrieve(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
             serializer = self.get_serializer(instance)
-            return Response({
+            response = Response({
                 'status': 'success',
                 'data': serializer.data
             })
+            if self.cached_object:
+                mark_cache_served(response)
+            return response
         except NotFound as e:
             return Response({
                 'status': 'error',
@@ -87,9 +237,12 @@ class NoteRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             instance = self.get_object()
             serializer = self.get_serializer(instance, data=request.data)
             serializer.is_valid(raise_exception=True)
-            self.perform_update(serializer)
+            # Restored only now, so an invalid write leaves it archived.
+            with transaction.atomic():
+                serializer.instance = self.restore_archived_object(instance)
+                self.perform_update(serializer)
             
-            cache.delete('notes_all')
+            invalidate_note_lists()
             cache.delete(f'note_{instance.pk}')
             
             return Response({
@@ -110,9 +263,10 @@ class NoteRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     def destroy(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
-            self.perform_destroy(instance)
+            with transaction.atomic():
+                self.perform_destroy(self.restore_archived_object(instance))
             
-            cache.delete('notes_all')
+            invalidate_note_lists()
             cache.delete(f'note_{instance.pk}')
             
             return Response({
@@ -123,4 +277,189 @@ class NoteRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return Response({
                 'status': 'error',
                 'message': str(e)
-            }, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            }, status=status.HTTP_404_NOT_FOUND)
+
+
+class NoteHistoryView(generics.ListAPIView):
+
+    serializer_class = NoteRevisionSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = None
+    throttle_scope = 'notes'
+
+    def get_queryset(self):
+        return NoteRevision.objects.filter(note_id=self.kwargs.get('pk')).order_by('-version')
+
+    def list(self, request, *args, **kwargs):
+        if not note_exists(self.kwargs['pk']):
+            return Response({
+                'status': 'error',
+                'message': _('Note not found')
+            }, status=status.HTTP_404_NOT_FOUND)
+        response = super().list(request, *args, **kwargs)
+        return Response({
+            'status': 'success',
+            'count': len(response.data),
+            'results': response.data
+        })
+
+
+class NoteRevisionDetailView(APIView):
+
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    throttle_scope = 'notes'
+
+    def get(self, request, pk, version):
+        try:
+            body = reconstruct(pk, version)
+        except NoteRevision.DoesNotExist:
+            return Response({
+                'status': 'error',
+                'message': _('Revision not found')
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'status': 'success',
+            'data': {
+                'version': version,
+                'body': body
+            }
+        })
+
+
+class NoteRevertView(generics.GenericAPIView):
+
+    queryset = Note.objects.all()
+    serializer_class = NoteRevertSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    throttle_scope = 'notes'
+
+    def post(self, request, pk):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+            body = reconstruct(pk, serializer.validated_data['version'])
+            note = Note.objects.filter(pk=pk).first() or restore_note(pk)
+            note.body = body
+        except ValidationError as e:
+            return Response({
+                'status': 'error',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except (ArchivedNote.DoesNotExist, NoteRevision.DoesNotExist):
+            return Response({
+                'status': 'error',
+                'message': _('Revision not found')
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        note.save()
+        invalidate_note_lists()
+        cache.delete(f'note_{note.pk}')
+
+        return Response({
+            'status': 'success',
+            'data': NoteSerializer(note).data
+        })
+
+
+def serialize_matches(matches):
+    """Serialized notes for (note_id, similarity) pairs, in order."""
+    notes = Note.objects.in_bulk([note_id for note_id, _ in matches])
+    results = []
+    for note_id, similarity in matches:
+        if note_id in notes:
+            data = NoteSerializer(notes[note_id]).data
+            data['similarity'] = round(similarity, 3)
+            results.append(data)
+    return results
+
+
+class NoteSearchView(APIView):
+    """
+    Typo-tolerant search: ?q=<text>, optional threshold (share of the query's
+    trigrams a note must contain) and limit.
+    """
+
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    throttle_scope = 'notes'
+
+    def get(self, request):
+        serializer = NoteSearchSerializer(data=request.query_params)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except ValidationError as e:
+            return Response({
+                'status': 'error',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        params = serializer.validated_data
+        results = serialize_matches(search(params['q'], params.get('threshold'), params['limit']))
+        return Response({
+            'status': 'success',
+            'count': len(results),
+            'results': results
+        })
+
+
+class NoteSimilarView(APIView):
+
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    throttle_scope = 'notes'
+
+    def get(self, request, pk):
+        serializer = NoteSimilarSerializer(data=request.query_params)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except ValidationError as e:
+            return Response({
+                'status': 'error',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not note_exists(pk):
+            return Response({
+                'status': 'error',
+                'message': _('Note not found')
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        params = serializer.validated_data
+        # Archived notes aren't indexed, so they're compared by their body.
+        archived = ArchivedNote.objects.filter(pk=pk).values_list('body', flat=True).first()
+        results = serialize_matches(similar(pk, params.get('threshold'), params['limit'], body=archived))
+        return Response({
+            'status': 'success',
+            'count': len(results),
+            'results': results
+        })
+
+
+class NoteSyncView(generics.GenericAPIView):
+    """
+    Replay a batch of offline changes in one request and one transaction.
+    Returns which operations applied, which conflicted, and the server copy
+    of every note they touched so the client can merge.
+    """
+
+    serializer_class = NoteSyncSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'notes'
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except ValidationError as e:
+            return Response({
+                'status': 'error',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        applied, conflicts, notes = apply_operations(serializer.validated_data['operations'])
+        return Response({
+            'status': 'success',
+            'data': {
+                'applied': applied,
+                'conflicts': conflicts,
+                'notes': [NoteSerializer(note).data for note in notes.values() if note is not None],
+                'deleted': [pk for pk, note in notes.items() if note is None],
+            }
+        })
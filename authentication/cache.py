@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from .serializers import PublicUserSerializer, UserSerializer
+
+User = get_user_model()
+
+USER_CACHE_TIMEOUT = 60 * 15
+
+
+def user_cache_key(pk):
+    return f'user_{pk}'
+
+
+def get_serialized_user(user):
+    """`UserSerializer` data for `user`, cached until the user is saved."""
+    key = user_cache_key(user.pk)
+    data = cache.get(key)
+    if data is None:
+        data = dict(UserSerializer(user).data)
+        cache.set(key, data, timeout=USER_CACHE_TIMEOUT)
+    return data
+
+
+def get_serialized_users(ids):
+    """
+    `PublicUserSerializer` data for `ids`, in that order, skipping unknown
+    ids. Taken from the cached `UserSerializer` data, so cached users cost
+    one cache round trip, the rest one query.
+    """
+    keys = {user_cache_key(pk): pk for pk in ids}
+    found = {keys[key]: data for key, data in cache.get_many(keys).items()}
+    missing = [pk for pk in ids if pk not in found]
+    if missing:
+        fetched = {user.pk: dict(UserSerializer(user).data) for user in User.objects.filter(pk__in=missing)}
+        # Unknown ids are cached as False; creating the user invalidates it.
+        found.update({pk: fetched.get(pk, False) for pk in missing})
+        cache.set_many(
+            {user_cache_key(pk): found[pk] for pk in missing},
+            timeout=USER_CACHE_TIMEOUT,
+        )
+    fields = PublicUserSerializer.Meta.fields
+    return [{field: found[pk][field] for field in fields} for pk in ids if found[pk]]
@@ -1,22 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
-from .utils import register_social_user
-from google.oauth2 import id_token
-from google.auth.transport import requests
 
 User = get_user_model()
 
-from google.auth.transport import requests
-from google.oauth2 import id_token
-from rest_framework import serializers
-from django.conf import settings
-
 class GoogleSocialAuthSerializer(serializers.Serializer):
     auth_token = serializers.CharField()
 
     def validate_auth_token(self, auth_token):
+        # Imported here: the Google auth libraries are heavy and only this
+        # endpoint needs them.
+        from google.auth.transport import requests
+        from google.oauth2 import id_token
+
         try:
             idinfo = id_token.verify_oauth2_token(
                 auth_token,
@@ -46,6 +42,10 @@ class GoogleSocialAuthSerializer(serializers.Serializer):
             raise serializers.ValidationError(f"Unexpected error: {str(e)}")
 
 class UserSerializer(serializers.ModelSerializer):
+    # Declared so the serializer also works with a user model without the
+    # field, such as django.contrib.auth's.
+    auth_provider = serializers.CharField(read_only=True, default='email')
+
     class Meta:
         model = User
         fields = [
@@ -57,10 +57,42 @@ class UserSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'auth_provider']
 
+class PublicUserSerializer(serializers.ModelSerializer):
+    """What any signed-in user may see of another: no email."""
+
+    class Meta:
+        model = User
+        fields = ['id', 'first_name', 'last_name']
+
+class UserIdsSerializer(serializers.Serializer):
+    """Comma-separated user ids, as in ?ids=1,2,3."""
+    MAX_IDS = 100
+    # Larger ids overflow the database driver instead of matching nothing.
+    MAX_ID = 2 ** 63 - 1
+
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        try:
+            ids = [int(pk) for pk in value.split(',') if pk.strip()]
+        except ValueError:
+            raise serializers.ValidationError('Expected comma-separated user ids.')
+        if any(not 1 <= pk <= self.MAX_ID for pk in ids):
+            raise serializers.ValidationError(f'User ids must be between 1 and {self.MAX_ID}.')
+        # Drop duplicates, keeping the order.
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            raise serializers.ValidationError('At least one user id is required.')
+        if len(ids) > self.MAX_IDS:
+            raise serializers.ValidationError(f'At most {self.MAX_IDS} user ids are allowed.')
+        return ids
+
 class TokenRefreshSerializer(serializers.Serializer):
     refresh_token = serializers.CharField()
 
     def validate(self, attrs):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
         refresh_token = attrs.get('refresh_token')
         try:
             token = RefreshToken(refresh_token)
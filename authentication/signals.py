@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import user_cache_key
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_on_save(sender, instance, update_fields=None, **kwargs):
+    # Logging in only touches last_login, which isn't serialized.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    cache.delete(user_cache_key(instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def invalidate_user_on_delete(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
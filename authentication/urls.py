@@ -2,7 +2,8 @@ from django.urls import path
 from .views import (
     GoogleSocialAuthView,
     LogoutView,
-    UserDetailView
+    UserDetailView,
+    UserListView
 )
 
 app_name = 'authentication'
@@ -11,4 +12,5 @@ urlpatterns = [
     path('google/', GoogleSocialAuthView.as_view(), name='google-auth'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('me/', UserDetailView.as_view(), name='user-detail'),
+    path('users/', UserListView.as_view(), name='user-list'),
 ]
\ No newline at end of file
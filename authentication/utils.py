@@ -1,9 +1,9 @@
-from rest_framework_simplejwt.tokens import RefreshToken
-
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
 def register_social_user(provider, email, name):
+    from rest_framework_simplejwt.tokens import RefreshToken
+
     try:
         user = User.objects.get(email=email)
         if user.auth_provider != provider:
@@ -2,7 +2,8 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from .serializers import GoogleSocialAuthSerializer, UserSerializer
+from .cache import get_serialized_user, get_serialized_users
+from .serializers import GoogleSocialAuthSerializer, UserIdsSerializer
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -38,5 +39,12 @@ class UserDetailView(APIView):
     permission_classes = (IsAuthenticated,)
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(get_serialized_user(request.user))
+
+class UserListView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        serializer = UserIdsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(get_serialized_users(serializer.validated_data['ids']))
\ No newline at end of file
@@ -0,0 +1,165 @@
+import functools
+import hashlib
+import json
+import sys
+import threading
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.urls import URLResolver, get_resolver
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import permissions
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import get_schema_view
+from drf_yasg import openapi
+
+from api.compression import mark_cache_served
+
+info = openapi.Info(
+    title="QuickNote API",
+    default_version='v1',
+    description="API documentation for Notes application",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="aryansharma4844@gmail.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(
+    info,
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
+
+# The UI pages are cheap (drf_yasg renders them without the endpoints); the
+# schema they load with ?format=openapi is served from memory below.
+swagger_ui = schema_view.with_ui('swagger', cache_timeout=0)
+redoc_ui = schema_view.with_ui('redoc', cache_timeout=0)
+
+CONTENT_TYPES = {
+    'json': 'application/json; charset=utf-8',
+    'yaml': 'application/yaml; charset=utf-8',
+    'openapi': 'application/openapi+json; charset=utf-8',
+}
+
+_documents = {}
+_lock = threading.Lock()
+
+
+@functools.lru_cache
+def source_digest(modules):
+    """Hash of the source files of `modules`, which don't change while the process runs."""
+    digest = hashlib.sha256()
+    for name in modules:
+        path = getattr(sys.modules.get(name), '__file__', None)
+        if path:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def urlconf_fingerprint():
+    """
+    Hash of every route, the view behind it and the source of the view and
+    serializer modules, so a deploy that changes what a view documents also
+    invalidates the artifact.
+    """
+    routes = []
+    modules = set()
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            route = prefix + str(pattern.pattern)
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, route)
+            else:
+                callback = pattern.callback
+                routes.append(f'{route} {callback.__module__}.{callback.__qualname__}')
+                modules.add(callback.__module__)
+                view = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+                serializer = getattr(view, 'serializer_class', None)
+                if serializer is not None:
+                    modules.add(serializer.__module__)
+
+    walk(get_resolver().url_patterns, '')
+    routes.append(source_digest(tuple(sorted(modules))))
+    return hashlib.sha256('\n'.join(routes).encode()).hexdigest()[:16]
+
+
+def build_documents(fingerprint):
+    """Generate the schema by introspecting every view. Slow; see get_documents()."""
+    schema = OpenAPISchemaGenerator(info).get_schema(request=None, public=True)
+    return {
+        'fingerprint': fingerprint,
+        'json': OpenAPICodecJson(validators=[]).encode(schema).decode(),
+        'yaml': OpenAPICodecYaml(validators=[]).encode(schema).decode(),
+    }
+
+
+def write_artifact(path):
+    documents = build_documents(urlconf_fingerprint())
+    with open(path, 'w') as f:
+        json.dump(documents, f)
+    return documents
+
+
+def load_artifact(fingerprint):
+    try:
+        with open(settings.OPENAPI_SCHEMA_FILE) as f:
+            documents = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if documents.get('fingerprint') != fingerprint:
+        return None
+    return documents
+
+
+def get_documents():
+    """
+    The rendered schema for the current URLconf: from memory, else from the
+    artifact written by `manage.py generate_schema`, else generated once.
+    """
+    fingerprint = urlconf_fingerprint()
+    entry = _documents.get(fingerprint)
+    if entry is None:
+        with _lock:
+            entry = _documents.get(fingerprint)
+            if entry is None:
+                documents = load_artifact(fingerprint) or build_documents(fingerprint)
+                entry = {
+                    kind: (content.encode(), '"%s"' % hashlib.md5(content.encode()).hexdigest())
+                    for kind, content in documents.items() if kind in ('json', 'yaml')
+                }
+                _documents.clear()
+                _documents[fingerprint] = entry
+    return entry
+
+
+def schema_response(request, kind, content_type):
+    content, etag = get_documents()[kind]
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = mark_cache_served(HttpResponse(content, content_type=content_type))
+    response['ETag'] = etag
+    # Clients may keep it, but revalidate so they see a new deploy's schema.
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def schema_json(request, format):
+    kind = format.lstrip('.')
+    if kind not in ('json', 'yaml'):
+        raise Http404
+    return schema_response(request, kind, CONTENT_TYPES[kind])
+
+
+def schema_swagger_ui(request, *args, **kwargs):
+    if request.GET.get('format') == 'openapi':
+        return schema_response(request, 'json', CONTENT_TYPES['openapi'])
+    return swagger_ui(request, *args, **kwargs)
+
+
+def schema_redoc(request, *args, **kwargs):
+    if request.GET.get('format') == 'openapi':
+        return schema_response(request, 'json', CONTENT_TYPES['openapi'])
+    return redoc_ui(request, *args, **kwargs)
@@ -0,0 +1,27 @@
+from django.utils.module_loading import import_string
+
+
+def lazy_view(dotted_path):
+    """
+    View that imports `dotted_path` on its first request, so modules only
+    needed by rarely used pages are not imported by every server worker.
+    """
+    view = None
+
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path)
+        return view(request, *args, **kwargs)
+
+    # Only wrap views that are CSRF exempt themselves (DRF and drf_yasg views).
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+def lazy_include(module, app_name):
+    """
+    Like include(), but `module` is imported the first time a URL under the
+    prefix is resolved or reversed instead of when the URLconf loads.
+    """
+    return (module, app_name, app_name)
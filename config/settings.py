@@ -13,6 +13,8 @@ import os
 from pathlib import Path
 import mimetypes
 
+from corsheaders.defaults import default_headers
+
 mimetypes.add_type("text/css", ".css", True)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,7 +52,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    # "whitenoise.middleware.WhiteNoiseMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+    'api.profiling.SamplingProfilerMiddleware',
+    'api.compression.CompressionMiddleware',
 
     "corsheaders.middleware.CorsMiddleware",
 
@@ -107,10 +111,83 @@ SWAGGER_SETTINGS = {
     'PERSIST_AUTH': True,    
 }
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
+    'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.openapi.AutoSchema',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 10
+    'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.SlidingWindowThrottle',
+    ],
+    # Per user (or IP when anonymous), for views with throttle_scope = 'notes'.
+    'DEFAULT_THROTTLE_RATES': {
+        'notes_read': os.environ.get('NOTES_READ_RATE', '600/min'),
+        'notes_write': os.environ.get('NOTES_WRITE_RATE', '120/min'),
+    },
+}
+# OpenAPI schema (config.docs), written by `manage.py generate_schema` at
+# deploy time. Generated on first use instead if missing or out of date.
+OPENAPI_SCHEMA_FILE = BASE_DIR / 'openapi-schema.json'
+
+# Sampling profiler (api.profiling)
+# Profiles SAMPLE_RATE of all requests plus any request sending a signed token
+# in HEADER. Tokens are shown on /admin/profiles/, where profiles can be browsed.
+PROFILING = {
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', 0)),
+    'INTERVAL': 0.005,
+    'DIRECTORY': BASE_DIR / 'profiles',
+    'MAX_FILES': 200,
+    'HEADER': 'X-Profile-Token',
+    'TOKEN_MAX_AGE': 60 * 60,
+}
+
+# Note revisions store line deltas, with a full snapshot every N versions so
+# rebuilding any version applies at most N - 1 deltas.
+NOTE_REVISION_SNAPSHOT_INTERVAL = 10
+
+# Background tasks (api.tasks)
+# Side effects of writes are stored in the api_task table and run after commit
+# by a small thread pool in each web process (IN_PROCESS) or by
+# `manage.py run_workers`.
+TASK_QUEUE = {
+    'IN_PROCESS': True,
+    'WORKERS': 2,
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 2,
+    'STALE_AFTER': 300,
 }
+
+# Trigram index (api.trigrams) behind /notes/search/ and /notes/<pk>/similar/.
+# Kept up to date by a background task on every Note save; build it for
+# existing notes with `manage.py build_trigram_index`.
+TRIGRAM_INDEX = {
+    'SEARCH_THRESHOLD': 0.5,
+    'SIMILAR_THRESHOLD': 0.5,
+    'SIMILAR_CANDIDATES': 100,
+    'MINHASH_BANDS': 20,
+    'MINHASH_ROWS': 5,
+}
+
+# Idempotency-Key handling for POST /notes/ (see api.idempotency): responses
+# are kept for TTL seconds; a retry arriving while the first request is
+# still running waits up to WAIT_TIMEOUT for it.
+IDEMPOTENCY = {
+    'TTL': 60 * 60 * 24,
+    'LOCK_TIMEOUT': 30,
+    'WAIT_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.05,
+}
+
+# Cache
+# Throttle counters must be shared for limits to hold across server workers:
+# set REDIS_URL in production. The default is a per-process memory cache.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
@@ -118,6 +195,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Several server workers and task threads write concurrently: take the
+        # write lock when a transaction starts and wait for it, instead of
+        # failing with "database is locked" on a read-to-write upgrade.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -170,7 +254,16 @@ STATICFILES_DIRS = [
 # also you need to configure urls.py and whitenoise to work this
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
-# STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# collectstatic writes hashed names plus .gz/.br copies of every file, which
+# whitenoise serves with a far-future immutable Cache-Control header.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'config.storage.StaticFilesStorage',
+    },
+}
 WHITENOISE_MIMETYPES = {
     '.xsl': 'application/xml'
 }
@@ -181,3 +274,4 @@ WHITENOISE_MIMETYPES = {
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
@@ -0,0 +1,15 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Hashed, precompressed (gzip and brotli) static files.
+
+    Until collectstatic has written a manifest, e.g. in development and tests,
+    plain file names are used instead of failing on every {% static %} tag.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
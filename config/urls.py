@@ -3,38 +3,27 @@ from django.urls import path, include
 from django.views.generic import TemplateView
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from django.contrib.auth.views import LogoutView
+from api.admin import profile_detail_view, profile_list_view
+from .lazy import lazy_include, lazy_view
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="QuickNote API",
-        default_version='v1',
-        description="API documentation for Notes application",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="aryansharma4844@gmail.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
-
+# The API docs (drf_yasg) and the auth stacks (social_django, Google auth)
+# are only imported when first used; see config/lazy.py.
 urlpatterns = [
+    path('admin/profiles/', admin.site.admin_view(profile_list_view), name='profile-list'),
+    path('admin/profiles/<str:name>/', admin.site.admin_view(profile_detail_view), name='profile-detail'),
     path('admin/', admin.site.urls),
     path('', include('api.urls')),
     path('', TemplateView.as_view(template_name='index.html')),
-    path('api/auth/', include('authentication.urls')),
-    path('auth/', include('social_django.urls', namespace='social')),
+    path('api/auth/', lazy_include('authentication.urls', 'authentication')),
+    path('auth/', lazy_include('social_django.urls', 'social')),
     
     # Swagger URLs
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('swagger<format>/', lazy_view('config.docs.schema_json'), name='schema-json'),
+    path('swagger/', lazy_view('config.docs.schema_swagger_ui'), name='schema-swagger-ui'),
+    path('redoc/', lazy_view('config.docs.schema_redoc'), name='schema-redoc'),
     
     # Auth URLs for Swagger
     path('accounts/login/', admin.site.login, name='login'),
     path('accounts/logout/', LogoutView.as_view(), name='logout'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-
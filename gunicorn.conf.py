@@ -0,0 +1,158 @@
+"""
+Gunicorn configuration for QuickNote.
+
+    gunicorn                              # gthread profile
+    GUNICORN_PROFILE=sync gunicorn
+    GUNICORN_PROFILE=uvicorn gunicorn     # ASGI, needs uvicorn-worker
+
+Workers are sized from the CPUs available to the process. Once the app is
+preloaded, they are capped by how many copies of the master's RSS fit in the
+available (or cgroup-limited) memory. That is conservative: with
+copy-on-write a worker's own share (PSS) is closer to 30 MB than the
+master's ~80 MB. GUNICORN_WORKER_MEMORY_MB replaces the estimate, and every
+other value can be overridden with the GUNICORN_* variables read below or
+on the command line.
+
+Load test: 32 keep-alive clients for 20s, GET /notes/ and GET /notes/<pk>/
+mixed 50/50, DEBUG=False, SQLite, 1 vCPU shared with the load generator:
+
+    profile   workers x threads   req/s   p50 ms   p99 ms   PSS/worker
+    sync      3 x 1                 420       70      131     30-31 MB
+    gthread   2 x 4                 507       59      159     30-37 MB
+    uvicorn   2 x 1                 215      142      270     32-51 MB
+
+gthread and uvicorn clients saw a few resets: keep-alive connections are
+dropped when a worker is recycled after max_requests. gthread is the
+default. uvicorn only pays off once views are async, because Django runs
+sync views on a single thread per ASGI worker.
+"""
+import gc
+import multiprocessing
+import os
+
+PROFILES = {
+    'sync': {
+        'worker_class': 'sync',
+        'threads': 1,
+        'workers_per_cpu': 2,
+        'app': 'config.wsgi:application',
+    },
+    'gthread': {
+        'worker_class': 'gthread',
+        'threads': 4,
+        'workers_per_cpu': 1,
+        'app': 'config.wsgi:application',
+    },
+    'uvicorn': {
+        'worker_class': 'uvicorn_worker.UvicornWorker',
+        'threads': 1,
+        'workers_per_cpu': 1,
+        'app': 'config.asgi:application',
+    },
+}
+
+
+def cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+def available_memory():
+    """Bytes available to this process: MemAvailable, capped by a cgroup limit."""
+    available = None
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    available = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                limit = f.read().strip()
+        except OSError:
+            continue
+        if limit.isdigit():
+            available = min(available or int(limit), int(limit))
+    return available
+
+
+def current_rss():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+profile = PROFILES[os.environ.get('GUNICORN_PROFILE', 'gthread')]
+
+wsgi_app = profile['app']
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+worker_class = profile['worker_class']
+threads = int(os.environ.get('GUNICORN_THREADS', profile['threads']))
+workers = int(os.environ.get('GUNICORN_WORKERS', profile['workers_per_cpu'] * cpu_count() + 1))
+
+# Share imported code between workers copy-on-write.
+preload_app = True
+
+# Recycle workers to bound slow memory growth; the jitter keeps them from
+# all restarting at once.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Heartbeat files on tmpfs, so a slow disk can't make workers look dead.
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+# Fraction of available memory the workers may use together.
+memory_fraction = float(os.environ.get('GUNICORN_MEMORY_FRACTION', 0.75))
+
+
+def when_ready(server):
+    # Import the URLconf in the master so workers share it as well.
+    from django.conf import settings
+    from django.urls import get_resolver
+    get_resolver(settings.ROOT_URLCONF).url_patterns
+
+    per_worker = int(os.environ.get('GUNICORN_WORKER_MEMORY_MB', 0)) * 1024 * 1024 or current_rss()
+    memory = available_memory()
+    if memory and 'GUNICORN_WORKERS' not in os.environ:
+        fitting = max(1, int(memory * memory_fraction // per_worker))
+        if fitting < server.num_workers:
+            server.num_workers = fitting
+    server.log.info(
+        'Profile %s: %d workers x %d threads, ~%d MB per worker',
+        worker_class, server.num_workers, threads, per_worker // (1024 * 1024),
+    )
+
+
+def pre_fork(server, worker):
+    # Keep the garbage collector from touching (and so copying) the
+    # preloaded objects in every worker.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from django.db import connections
+
+    # Connections opened in the master must not be shared between workers.
+    connections.close_all()
+
+    from api.views import warm_caches
+    warm_caches()
+    # Requests run on other threads with their own connections.
+    connections.close_all()